@@ -1,12 +1,11 @@
 import argparse
-import generator
 
 if __name__ == '__main__':
 
     parser = argparse.ArgumentParser(
         description="Tiny static site generator.")
 
-    parser.add_argument('command', nargs='?', default='', help="'build', 'serve' or 'new'")
+    parser.add_argument('command', nargs='?', default='', help="'build', 'serve', 'new' or 'daemon'")
 
     parser.add_argument('-r', '--root', help='''The root folder wuth your source files.''', type=str, default='.')
 
@@ -18,22 +17,110 @@ if __name__ == '__main__':
 
     parser.add_argument('-f', '--force', help='''Build this site even if there already exists index.html.''', action='store_true')
 
+    parser.add_argument('-j', '--jobs', help='''Number of parallel workers for rendering pages.''', type=int, default=1)
+
+    parser.add_argument('--full', help='''Rebuild all pages, ignore results of previous build.''', action='store_true')
+
+    parser.add_argument('-b', '--backend', help='''How templates are rendered: 'tree' or 'codegen'.''', type=str, default='tree', choices=['tree', 'codegen'])
+
+    parser.add_argument('-m', '--in-memory', help='''Serve pages rendered on request, without writing site to disk.''', action='store_true')
+
+    parser.add_argument('-z', '--gzip', help='''Precompress text files into .gz files with given level (1-9).''', type=int, default=None, nargs='?', const=9)
+
+    parser.add_argument('--link-assets', help='''Hardlink assets into output folder instead of copying them.''', action='store_true')
+
+    parser.add_argument('--fingerprint', help='''Add content hash to asset names and rewrite references to them.''', action='store_true')
+
+    parser.add_argument('--profile', help='''Print timings of slowest pages, build phases and cache hit rates.''', action='store_true')
+
+    parser.add_argument('--minify', help='''Collapse whitespace and strip comments of pages, pre, textarea, script and style are kept.''', action='store_true')
+
+    parser.add_argument('--search', help='''Collect words of pages while they are written into search-index.json and search-index.bin.''', action='store_true')
+
+    parser.add_argument('--no-cache', help='''Do not keep compiled templates in .tssg-cache between runs.''', action='store_true')
+
+    parser.add_argument('--cache-size', help='''Size limit of .tssg-cache in megabytes, least recently used entries are removed.''', type=int, default=64)
+
+    parser.add_argument('--snapshots', help='''Build into new version next to output folder, publish it by atomic symlink swap and keep given number of versions.''', type=int, default=None, nargs='?', const=3)
+
+    parser.add_argument('-i', '--ignore', help='''Glob of source paths which are not pages, e.g. 'drafts/' or '.git', can be repeated.''', action='append', default=[])
+
+    parser.add_argument('--profile-trace', help='''Save build profile as Chrome trace (chrome://tracing) into this file.''', type=str, default=None)
+
+    parser.add_argument('--socket', help='''Unix socket of daemon, .tssg-daemon.sock in root by default.''', type=str, default=None)
+
+    parser.add_argument('--send', help='''Send request to running daemon instead of starting one.''', type=str, default=None, choices=['build', 'build-page', 'stats'])
+
+    parser.add_argument('--page', help='''Page for 'build-page' request of daemon.''', type=str, default=None)
+
     args = parser.parse_args()
 
+    # Every command imports only modules it needs, see src/tests/bench_startup.py.
     if args.command == 'build':
-        generator.build_files(root=args.root,
-                              dest=args.output,
-                              force=args.force,
-                              watch=args.watch)
+        from generator import build_files
+        build_files(root=args.root,
+                    dest=args.output,
+                    force=args.force,
+                    watch=args.watch,
+                    jobs=args.jobs,
+                    full=args.full,
+                    backend=args.backend,
+                    gzip_level=args.gzip,
+                    link_assets=args.link_assets,
+                    fingerprint=args.fingerprint,
+                    profile=args.profile,
+                    profile_trace=args.profile_trace,
+                    snapshots=args.snapshots,
+                    ignore=args.ignore,
+                    minify=args.minify,
+                    disk_cache=not args.no_cache,
+                    cache_size=args.cache_size * 1024 * 1024,
+                    search=args.search)
     elif args.command == 'serve':
-        generator.serve_files(root=args.root,
-                              dest=args.output,
-                              watch=args.watch,
-                              port=args.port,
-                              force=args.force)
+        from server import serve_files
+        serve_files(root=args.root,
+                    dest=args.output,
+                    watch=args.watch,
+                    port=args.port,
+                    force=args.force,
+                    jobs=args.jobs,
+                    backend=args.backend,
+                    in_memory=args.in_memory,
+                    gzip_level=args.gzip,
+                    link_assets=args.link_assets,
+                    fingerprint=args.fingerprint,
+                    profile=args.profile,
+                    profile_trace=args.profile_trace,
+                    snapshots=args.snapshots,
+                    ignore=args.ignore,
+                    minify=args.minify,
+                    disk_cache=not args.no_cache,
+                    cache_size=args.cache_size * 1024 * 1024,
+                    search=args.search)
     elif args.command == 'new':
-        generator.new_site(root=args.root,
-                           force=args.force)
+        from scaffold import new_site
+        new_site(root=args.root,
+                 force=args.force)
+    elif args.command == 'daemon' and args.send:
+        from daemon_client import send_command
+        send_command(args.send,
+                     root=args.root,
+                     socket_path=args.socket,
+                     page=args.page,
+                     full=args.full)
+    elif args.command == 'daemon':
+        from daemon import run_daemon
+        run_daemon(root=args.root,
+                   dest=args.output,
+                   socket_path=args.socket,
+                   jobs=args.jobs,
+                   backend=args.backend,
+                   gzip_level=args.gzip,
+                   link_assets=args.link_assets,
+                   fingerprint=args.fingerprint,
+                   ignore=args.ignore,
+                   minify=args.minify,
+                   search=args.search)
     else:
-        print("Please type a valid command, either 'build', 'serve' or 'new'.")
+        print("Please type a valid command, either 'build', 'serve', 'new' or 'daemon'.")
         parser.print_help()
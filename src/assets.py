@@ -0,0 +1,114 @@
+import os
+import shutil
+
+from manifest import file_hash
+from fingerprint import FINGERPRINTED_REGEX
+
+ASSET_DIRS = ('css', 'images', 'fonts', 'js')
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+def fast_copy(source, target):
+    """Copy file inside the kernel with copy_file_range, falling back to shutil (sendfile)."""
+    if hasattr(os, 'copy_file_range'):
+        try:
+            with open(source, 'rb') as src, open(target, 'wb') as dst:
+                while os.copy_file_range(src.fileno(), dst.fileno(), COPY_CHUNK_SIZE):
+                    pass
+            return
+        except OSError:
+            pass
+    shutil.copyfile(source, target)
+
+
+def is_same_file(source, target):
+    """Compare size and mtime, and content hash only if mtime differs."""
+    try:
+        src_st, dst_st = os.stat(source), os.stat(target)
+    except OSError:
+        return False
+    if src_st.st_size != dst_st.st_size:
+        return False
+    if (src_st.st_dev, src_st.st_ino) == (dst_st.st_dev, dst_st.st_ino):
+        return True
+    if src_st.st_mtime_ns == dst_st.st_mtime_ns:
+        return True
+    if file_hash(source) == file_hash(target):
+        shutil.copystat(source, target)
+        return True
+    return False
+
+
+def sync_file(source, target, link=False):
+    """Copy or hardlink changed file, remove target if source is gone. Return True if target changed."""
+    if not os.path.isfile(source):
+        if os.path.exists(target):
+            os.remove(target)
+            return True
+        return False
+    if is_same_file(source, target):
+        return False
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    tmp_target = target + '.tmp'
+    if link:
+        try:
+            os.link(source, tmp_target)
+        except OSError:
+            link = False
+    if not link:
+        fast_copy(source, tmp_target)
+        shutil.copystat(source, tmp_target)
+    os.replace(tmp_target, target)
+    return True
+
+
+def is_derived(relpath, sources, fingerprint=False):
+    """
+    Files made by later build stages are not stale: precompressed .gz copies and,
+    with fingerprint, fingerprinted copies of sources (fingerprint_assets cleans them up).
+    """
+    if relpath[-3:] == '.gz':
+        return relpath[:-3] in sources or is_derived(relpath[:-3], sources, fingerprint)
+    match = FINGERPRINTED_REGEX.match(relpath) if fingerprint else None
+    return match is not None and match.group(1) + match.group(3) in sources
+
+
+def sync_dir(source, target, link=False, fingerprint=False):
+    """
+    Make target a copy of source, touching only changed files, see is_derived for kept extra files.
+
+    Return (copied, skipped, removed) counters.
+    """
+    copied = skipped = removed = 0
+    sources = set()
+    for dirpath, dirnames, filenames in os.walk(source):
+        for filename in filenames:
+            relpath = os.path.relpath(os.path.join(dirpath, filename), source)
+            sources.add(relpath)
+            if sync_file(os.path.join(source, relpath), os.path.join(target, relpath), link=link):
+                copied += 1
+            else:
+                skipped += 1
+    for dirpath, dirnames, filenames in os.walk(target, topdown=False):
+        for filename in filenames:
+            relpath = os.path.relpath(os.path.join(dirpath, filename), target)
+            if relpath not in sources and not is_derived(relpath, sources, fingerprint):
+                os.remove(os.path.join(dirpath, filename))
+                removed += 1
+        if dirpath != target and not os.listdir(dirpath):
+            os.rmdir(dirpath)
+    return copied, skipped, removed
+
+
+def sync_assets(root='.', dest='site', asset_dirs=ASSET_DIRS, link=False, fingerprint=False):
+    """Sync every asset directory of site into output folder, drop copies of removed ones."""
+    totals = [0, 0, 0]
+    for name in asset_dirs:
+        source = os.path.join(root, name)
+        if not os.path.isdir(source):
+            shutil.rmtree(os.path.join(root, dest, name), ignore_errors=True)
+        else:
+            counts = sync_dir(source, os.path.join(root, dest, name), link=link, fingerprint=fingerprint)
+            for i, count in enumerate(counts):
+                totals[i] += count
+    return tuple(totals)
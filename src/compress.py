@@ -0,0 +1,88 @@
+import os
+import gzip
+
+COMPRESSIBLE_EXTENSIONS = ('.html', '.css', '.js', '.json', '.svg', '.xml', '.txt')
+# level of .gz files in output folder, they are all rewritten when it changes
+LEVEL_NAME = '.tssg-gzip-level'
+
+
+def is_compressible(path):
+    return os.path.splitext(path)[1] in COMPRESSIBLE_EXTENSIONS
+
+
+def is_up_to_date(path, compressed_path):
+    """
+    Compressed copy was made from file as it is now.
+
+    compress_file gives .gz exactly the mtime of its source and gzip trailer keeps
+    size of uncompressed data, so file replaced by an older or another one does not match.
+    """
+    try:
+        st = os.stat(path)
+        if os.stat(compressed_path).st_mtime_ns != st.st_mtime_ns:
+            return False
+        with open(compressed_path, 'rb') as file:
+            file.seek(-4, os.SEEK_END)
+            return int.from_bytes(file.read(4), 'little') == st.st_size & 0xffffffff
+    except OSError:
+        return False
+
+
+def compress_file(path, level=9, force=False):
+    """Write path + '.gz' next to the file, return False if it is already up to date."""
+    compressed_path = path + '.gz'
+    if not force and is_up_to_date(path, compressed_path):
+        return False
+    st = os.stat(path)
+    with open(path, 'rb') as file:
+        data = gzip.compress(file.read(), compresslevel=level, mtime=0)
+    tmp_path = compressed_path + '.tmp'
+    with open(tmp_path, 'wb') as file:
+        file.write(data)
+    os.utime(tmp_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+    os.replace(tmp_path, compressed_path)
+    return True
+
+
+def read_level(dest):
+    try:
+        with open(os.path.join(dest, LEVEL_NAME)) as file:
+            return int(file.read())
+    except (OSError, ValueError):
+        return None
+
+
+def write_level(dest, level):
+    """Replace level file, so hardlinked copy in previous snapshot is not changed."""
+    path = os.path.join(dest, LEVEL_NAME)
+    with open(path + '.tmp', 'w') as file:
+        file.write(str(level))
+    os.replace(path + '.tmp', path)
+
+
+def compress_tree(dest, level=9, jobs=None):
+    """
+    Precompress text files in dest in parallel threads.
+
+    Up to date .gz files are skipped unless they were written with another level,
+    .gz files whose source is gone are removed.
+    Return number of written files.
+    """
+    force = read_level(dest) != level
+    paths = []
+    for dirpath, dirnames, filenames in os.walk(dest):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            if filename.startswith('.'):
+                continue
+            if filename[-3:] == '.gz':
+                if not os.path.exists(path[:-3]):
+                    os.remove(path)
+            elif is_compressible(path):
+                paths.append(path)
+    import concurrent.futures
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        written = sum(executor.map(lambda path: compress_file(path, level, force), paths))
+    if force:
+        write_level(dest, level)
+    return written
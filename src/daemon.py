@@ -0,0 +1,233 @@
+"""
+Long running build process.
+
+Sources, dependency manifest, read templates, compiled trees and pool of workers stay in
+memory between builds, watcher rebuilds affected pages as soon as sources change. Clients talk to it
+over a Unix domain socket, one JSON object per line in both directions:
+
+    {"command": "build"}                          incremental build, {"full": true} rebuilds all
+    {"command": "build-page", "page": "a.html"}   build one page or data binding
+    {"command": "stats"}                          counters of builds and caches
+"""
+import os
+import sys
+import json
+import time
+import signal
+import threading
+import socketserver
+import collections
+from concurrent.futures import BrokenExecutor
+
+from manifest import BuildManifest
+from discovery import find_pages
+from datasource import find_bindings, is_binding
+from generator import check_watchable, make_executor, page_patterns, rebuild_changed, update_pages, update_site
+from generator import watching
+from daemon_client import DEFAULT_SOCKET, is_running
+import profiler
+
+
+class BuildDaemon(object):
+    """
+    Site which is built in this process on request.
+
+    Requests and watcher rebuilds are serialized by a lock, the manifest is kept in memory,
+    so dependency information is never read back from disk. With jobs > 1 pages are built
+    by one pool of workers for the whole life of daemon, close() stops it. Pool whose worker
+    died is replaced and the build is run once more.
+    """
+
+    def __init__(self, root='.', dest='site', jobs=1, backend='tree', gzip_level=None, link_assets=False,
+                 fingerprint=False, ignore=(), minify=False, search=False):
+        self.root = root
+        self.dest = dest
+        self.jobs = jobs
+        self.gzip_level = gzip_level
+        self.link_assets = link_assets
+        self.fingerprint = fingerprint
+        self.ignore = ignore
+        self.patterns = page_patterns(dest, ignore)
+        self.executor = make_executor(jobs, fresh_workers=True) if jobs > 1 else None
+        self.options = {'backend': backend, 'url': dest, 'minify': minify, 'search': search,
+                        'executor': self.executor}
+        self.manifest = BuildManifest(root, dest).load()
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.builds = 0
+        self.last_build = None
+
+    def build(self, full=False):
+        """Build every outdated page, with full all of them."""
+        with self.lock:
+            started = time.time()
+            files = find_pages(self.root, self.patterns) + find_bindings(self.root)
+            errors, counts = self.run(lambda: update_site(
+                self.manifest, files, self.dest, root=self.root, jobs=self.jobs, full=full,
+                link_assets=self.link_assets, fingerprint=self.fingerprint, **self.options))
+            return self.finish(started, errors, counts)
+
+    def build_page(self, page):
+        """Build page or data binding page, even if it is up to date."""
+        page = os.path.normpath(page).replace(os.sep, '/')
+        if not self.is_page(page):
+            return {'ok': False, 'error': 'Not a page: {0}'.format(page)}
+        with self.lock:
+            started = time.time()
+            errors, counts = self.run(lambda: update_pages(
+                self.manifest, [page], self.dest, root=self.root, jobs=self.jobs,
+                assets=self.manifest.settings.get('assets'), **self.options))
+            return self.finish(started, errors, counts)
+
+    def is_page(self, page):
+        if page.startswith('../') or not os.path.isfile(os.path.join(self.root, page)):
+            return False
+        if is_binding(page):
+            return '/' not in page
+        return page.endswith('.html') and not self.patterns.is_ignored(page, is_dir=False)
+
+    def finish(self, started, errors, counts, compress=True):
+        if compress and self.gzip_level is not None:
+            from compress import compress_tree
+            compress_tree(os.path.join(self.root, self.dest), level=self.gzip_level)
+        self.builds += 1
+        self.last_build = time.time() - started
+        return {
+            'ok': not errors,
+            'built': counts['built'],
+            'written': counts['written'],
+            'errors': [{'page': page, 'error': error} for page, error in errors],
+            'time': round(self.last_build, 6)
+        }
+
+    def stats(self):
+        return {
+            'ok': True,
+            'pid': os.getpid(),
+            'uptime': round(time.time() - self.started, 3),
+            'builds': self.builds,
+            'last_build': self.last_build,
+            'pages': len(self.manifest.pages),
+            'caches': profiler.cache_counters()
+        }
+
+    def on_change(self, changes):
+        """Rebuild pages affected by changed sources, see rebuild_changed."""
+        with self.lock:
+            started = time.time()
+            errors, counts = self.run(lambda: rebuild_changed(
+                changes, self.root, self.dest, jobs=self.jobs, backend=self.options['backend'],
+                gzip_level=self.gzip_level, link_assets=self.link_assets, fingerprint=self.fingerprint,
+                ignore=self.ignore, manifest=self.manifest, executor=self.executor))
+            self.finish(started, errors, counts, compress=False)
+
+    def run(self, build):
+        """Call build, if a worker died replace broken pool and call it once more."""
+        try:
+            return build()
+        except BrokenExecutor:
+            print("Worker process died, pool of workers is restarted")
+            self.restart_pool()
+        try:
+            return build()
+        except BrokenExecutor as e:
+            self.restart_pool()
+            return [(None, 'Worker process died: {0}'.format(e))], collections.Counter()
+
+    def restart_pool(self):
+        self.executor.shutdown(wait=False)
+        self.executor = self.options['executor'] = make_executor(self.jobs, fresh_workers=True)
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+
+    def handle(self, request):
+        """Answer one decoded request."""
+        if not isinstance(request, dict):
+            return {'ok': False, 'error': 'Request must be a JSON object'}
+        command = request.get('command')
+        if command == 'build':
+            return self.build(full=bool(request.get('full')))
+        if command == 'build-page':
+            if not isinstance(request.get('page'), str):
+                return {'ok': False, 'error': "'build-page' needs 'page'"}
+            return self.build_page(request['page'])
+        if command == 'stats':
+            return self.stats()
+        return {'ok': False, 'error': 'Unknown command: {0}'.format(command)}
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """Read requests line by line until client closes connection."""
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                response = self.server.build_daemon.handle(json.loads(line.decode('utf-8')))
+            except ValueError as e:
+                response = {'ok': False, 'error': 'Bad request: {0}'.format(e)}
+            except Exception as e:
+                response = {'ok': False, 'error': '{0}: {1}'.format(type(e).__name__, e)}
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+class DaemonServer(socketserver.ThreadingUnixStreamServer):
+
+    daemon_threads = True
+
+    def __init__(self, path, build_daemon):
+        self.build_daemon = build_daemon
+        super().__init__(path, RequestHandler)
+
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def run_daemon(root='.', dest='site', socket_path=None, jobs=1, backend='tree', gzip_level=None,
+               link_assets=False, fingerprint=False, ignore=(), minify=False, search=False):
+    """
+    Build site, then serve requests on socket_path (DEFAULT_SOCKET in root) and rebuild on changes.
+
+    Compiled templates are kept in memory of this process, the persistent disk cache is not used.
+    Output folder published as snapshot is refused, it would be changed in place.
+    """
+    if not os.path.exists(os.path.join(root, 'index.html')):
+        print("Sorry, index.html not found! Try to create new site, use for it 'new'")
+        sys.exit(1)
+    check_watchable(root, dest)
+    socket_path = socket_path or os.path.join(root, DEFAULT_SOCKET)
+    if os.path.exists(socket_path):
+        if is_running(socket_path):
+            print("Daemon is already running on {0}".format(socket_path))
+            sys.exit(1)
+        os.remove(socket_path)
+    os.makedirs(os.path.join(root, dest), exist_ok=True)
+
+    daemon = BuildDaemon(root, dest, jobs=jobs, backend=backend, gzip_level=gzip_level, link_assets=link_assets,
+                         fingerprint=fingerprint, ignore=ignore, minify=minify, search=search)
+    result = daemon.build()
+    print("Built {0} pages in {1:.3f}s".format(result['built'], result['time']))
+
+    server = DaemonServer(socket_path, daemon)
+    server_thread = threading.Thread(target=server.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+    print("Daemon listens on {0}".format(socket_path))
+
+    # stop on 'kill' like on Ctrl+C, so socket is removed
+    signal.signal(signal.SIGTERM, _interrupt)
+    try:
+        watching(root, dest, jobs=jobs, backend=backend, on_change=daemon.on_change, ignore=ignore)
+    finally:
+        server.shutdown()
+        server.server_close()
+        daemon.close()
+        try:
+            os.remove(socket_path)
+        except OSError:
+            pass
@@ -0,0 +1,52 @@
+"""Client of build daemon, kept apart from it so requests start without importing the build."""
+import os
+import sys
+import json
+import socket
+
+DEFAULT_SOCKET = '.tssg-daemon.sock'
+
+
+def is_running(path):
+    """Check whether some daemon answers on socket path."""
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(path)
+        return True
+    except OSError:
+        return False
+    finally:
+        client.close()
+
+
+def send_request(request, socket_path=DEFAULT_SOCKET, timeout=None):
+    """Send request to running daemon and return decoded response."""
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(timeout)
+    try:
+        client.connect(socket_path)
+        client.sendall(json.dumps(request).encode('utf-8') + b'\n')
+        with client.makefile('rb') as reader:
+            line = reader.readline()
+    finally:
+        client.close()
+    if not line:
+        raise ConnectionError('Daemon closed connection without answer')
+    return json.loads(line.decode('utf-8'))
+
+
+def send_command(command, root='.', socket_path=None, page=None, full=False):
+    """Command line client: send request, print response and exit with 1 if it failed."""
+    request = {'command': command}
+    if page is not None:
+        request['page'] = page
+    if full:
+        request['full'] = True
+    try:
+        response = send_request(request, socket_path or os.path.join(root, DEFAULT_SOCKET))
+    except (OSError, ValueError) as e:
+        print("Daemon is not available: {0}".format(e))
+        sys.exit(1)
+    print(json.dumps(response, indent=1, sort_keys=True))
+    if not response.get('ok'):
+        sys.exit(1)
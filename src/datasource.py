@@ -0,0 +1,116 @@
+import os
+import csv
+import json
+import itertools
+
+BINDING_SUFFIX = '.data.json'
+FORMATS = {
+    '.jsonl': 'jsonl',
+    '.ndjson': 'jsonl',
+    '.csv': 'csv'
+}
+DATA_EXTENSIONS = ('.json',) + tuple(FORMATS)
+
+
+class DataBindingError(Exception):
+    """Wrong description of data driven pages."""
+
+
+def find_bindings(root='.'):
+    """Names of binding files in the root of site."""
+    return sorted(x for x in os.listdir(root) if x.endswith(BINDING_SUFFIX))
+
+
+def is_binding(name):
+    return name.endswith(BINDING_SUFFIX)
+
+
+class DataBinding(object):
+    """
+    Page template bound to records of JSON Lines or CSV file.
+
+    Binding is described by <name>.data.json in the root of site, e.g.
+
+        {"template": "templates/product.html", "source": "data/products.jsonl",
+         "output": "product-{id}.html"}
+
+    makes one page per record, record is available in template as 'record'.
+    With "per_page": N records are grouped into listing pages, "output" is formatted
+    with 'page' number and template gets 'items', 'page', 'previous_url' and 'next_url'.
+    Records are read lazily, at most two listing pages are kept in memory.
+    """
+
+    def __init__(self, name, template, source, output, per_page=None, format=None):
+        self.name = name
+        self.template = template
+        self.source = source
+        self.output = output
+        self.per_page = per_page
+        self.format = format or FORMATS.get(os.path.splitext(source)[1].lower())
+        if self.format not in FORMATS.values():
+            raise DataBindingError("{0}: unknown format of {1}".format(name, source))
+        if per_page is not None and (not isinstance(per_page, int) or per_page < 1):
+            raise DataBindingError("{0}: per_page must be positive integer".format(name))
+
+    @classmethod
+    def load(cls, root, name):
+        try:
+            with open(os.path.join(root, name), 'r') as file:
+                data = json.load(file)
+        except (IOError, ValueError) as e:
+            raise DataBindingError("{0}: {1}".format(name, e))
+        missing = [key for key in ('template', 'source', 'output') if key not in data]
+        if missing:
+            raise DataBindingError("{0}: missing {1}".format(name, ', '.join(missing)))
+        return cls(name, data['template'], data['source'], data['output'],
+                   per_page=data.get('per_page'), format=data.get('format'))
+
+    @property
+    def dependencies(self):
+        """Files besides template which affect generated pages."""
+        return [self.name, self.source]
+
+    def records(self, root='.'):
+        """Stream records of source one by one."""
+        with open(os.path.join(root, self.source), 'r', newline='', encoding='utf-8') as file:
+            if self.format == 'csv':
+                yield from csv.DictReader(file)
+            else:
+                for number, line in enumerate(file, 1):
+                    if line.strip():
+                        try:
+                            yield json.loads(line)
+                        except ValueError as e:
+                            raise DataBindingError("{0}:{1}: {2}".format(self.source, number, e))
+
+    def output_name(self, fields):
+        try:
+            name = self.output.format_map(fields)
+        except (KeyError, IndexError, ValueError) as e:
+            raise DataBindingError("{0}: can not format {1!r}: {2}".format(self.name, self.output, e))
+        if os.path.basename(name) != name or name.startswith('.'):
+            raise DataBindingError("{0}: wrong output name {1!r}".format(self.name, name))
+        return name
+
+    def pages(self, root='.'):
+        """Lazily yield (output name, context) of every generated page."""
+        records = self.records(root)
+        if self.per_page is None:
+            for index, record in enumerate(records):
+                if not isinstance(record, dict):
+                    raise DataBindingError("{0}: record {1} is not an object".format(self.source, index))
+                yield self.output_name(dict(record, index=index)), {'record': record, 'index': index}
+            return
+        chunk = list(itertools.islice(records, self.per_page))
+        page = 1
+        previous_url = ''
+        while chunk:
+            following = list(itertools.islice(records, self.per_page))
+            name = self.output_name({'page': page})
+            yield name, {
+                'items': chunk,
+                'page': page,
+                'previous_url': previous_url,
+                'next_url': self.output_name({'page': page + 1}) if following else ''
+            }
+            chunk, previous_url, page = following, name, page + 1
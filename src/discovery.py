@@ -0,0 +1,94 @@
+import os
+import re
+import fnmatch
+
+from snapshots import SNAPSHOTS_SUFFIX
+
+DEFAULT_IGNORE = ('.*', '*.tmp', 'templates/')
+
+
+class IgnorePatterns(object):
+    """
+    Gitignore-like glob patterns for paths relative to root.
+
+    Pattern without slash matches name at any depth ('.git', '*.tmp'),
+    pattern with leading or inner slash is matched against the whole relative path ('/site', 'blog/drafts'),
+    trailing slash limits pattern to directories ('templates/').
+    Ignored directory ignores everything inside it.
+    """
+
+    def __init__(self, patterns=()):
+        self.patterns = tuple(patterns)
+        groups = {(anchored, dirs_only): [] for anchored in (False, True) for dirs_only in (False, True)}
+        for pattern in self.patterns:
+            dirs_only = pattern.endswith('/')
+            pattern = pattern.rstrip('/')
+            anchored = '/' in pattern
+            pattern = pattern.lstrip('/')
+            if pattern:
+                groups[anchored, dirs_only].append(fnmatch.translate(pattern))
+        self._regexes = {key: re.compile('|'.join(value)) if value else None for key, value in groups.items()}
+
+    def match(self, relpath, is_dir=None):
+        """Check path itself, is_dir=None means that path can be directory."""
+        name = relpath.rsplit('/', 1)[-1]
+        for (anchored, dirs_only), regex in self._regexes.items():
+            if regex is None or (dirs_only and is_dir is False):
+                continue
+            if regex.match(relpath if anchored else name):
+                return True
+        return False
+
+    def is_ignored(self, relpath, is_dir=None):
+        """Check path and all directories above it."""
+        relpath = relpath.replace(os.sep, '/')
+        parts = relpath.split('/')
+        for i in range(1, len(parts)):
+            if self.match('/'.join(parts[:i]), is_dir=True):
+                return True
+        return self.match(relpath, is_dir=is_dir)
+
+    def __call__(self, relpath, entry):
+        return self.match(relpath, is_dir=entry.is_dir(follow_symlinks=False))
+
+
+def walk(top, ignore=None):
+    """
+    Yield (relative path, DirEntry) of every file below top.
+
+    Directories are listed with os.scandir and their entries' cached types are used,
+    so no separate stat is made per entry. ignore(relpath, entry) prunes files and
+    whole directories, symlinks to directories are not followed.
+    """
+    stack = ['']
+    while stack:
+        prefix = stack.pop()
+        try:
+            entries = list(os.scandir(os.path.join(top, prefix) if prefix else top))
+        except OSError:
+            continue
+        entries.sort(key=lambda x: x.name)
+        dirs = []
+        for entry in entries:
+            relpath = prefix + entry.name
+            if ignore is not None and ignore(relpath, entry):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                dirs.append(relpath + '/')
+            else:
+                yield relpath, entry
+        stack.extend(reversed(dirs))
+
+
+def output_ignore(dest):
+    """Patterns which keep output folder and its snapshots out of sources."""
+    dest = os.path.normpath(dest).replace(os.sep, '/')
+    return ('/' + dest, '/' + dest + SNAPSHOTS_SUFFIX)
+
+
+def find_pages(root='.', ignore=DEFAULT_IGNORE, extension='.html'):
+    """Sorted relative paths of pages at any depth below root, output paths keep the same layout."""
+    if not isinstance(ignore, IgnorePatterns):
+        ignore = IgnorePatterns(ignore)
+    return sorted(relpath for relpath, entry in walk(root, ignore)
+                  if relpath.endswith(extension) and entry.is_file())
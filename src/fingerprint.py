@@ -0,0 +1,114 @@
+import os
+import re
+import posixpath
+
+from manifest import file_hash, write_json
+
+ASSET_MANIFEST_NAME = 'asset-manifest.json'
+HASH_LENGTH = 10
+FINGERPRINTED_REGEX = re.compile(r'^(.*)\.([0-9a-f]{%d})(\.[^.]+)$' % HASH_LENGTH)
+
+
+def fingerprinted_name(relpath, digest):
+    """css/style.css -> css/style.<hash>.css"""
+    base, extension = os.path.splitext(relpath)
+    return '{0}.{1}{2}'.format(base, digest[:HASH_LENGTH], extension)
+
+
+def fingerprint_assets(root='.', dest='site', asset_dirs=()):
+    """
+    Link every copied asset to name with its content hash and remove outdated fingerprinted copies.
+
+    Return dict of original relative url -> fingerprinted one, it is also written
+    into asset-manifest.json in output folder.
+    """
+    output = os.path.join(root, dest)
+    assets = {}
+    existing = set()
+    for name in asset_dirs:
+        for dirpath, dirnames, filenames in os.walk(os.path.join(output, name)):
+            for filename in filenames:
+                relpath = os.path.relpath(os.path.join(dirpath, filename), output).replace(os.sep, '/')
+                if filename[-3:] == '.gz' or filename.startswith('.'):
+                    continue
+                match = FINGERPRINTED_REGEX.match(relpath)
+                if match and os.path.exists(os.path.join(output, match.group(1) + match.group(3))):
+                    existing.add(relpath)
+                else:
+                    assets[relpath] = fingerprinted_name(relpath, file_hash(os.path.join(output, relpath)))
+    for relpath, hashed in assets.items():
+        hashed_path = os.path.join(output, hashed)
+        if hashed not in existing:
+            try:
+                os.link(os.path.join(output, relpath), hashed_path)
+            except OSError:
+                with open(os.path.join(output, relpath), 'rb') as src, open(hashed_path, 'wb') as dst:
+                    dst.write(src.read())
+    current = set(assets.values())
+    for relpath in existing - current:
+        os.remove(os.path.join(output, relpath))
+    write_json(os.path.join(output, ASSET_MANIFEST_NAME), assets)
+    return assets
+
+
+class ReferenceRewriter(object):
+    """
+    Writable stream which replaces asset urls by fingerprinted ones on the way to another stream.
+
+    Text is scanned once, chunk by chunk, only tail which could be start of url is held back.
+    Absolute urls ('/css/style.css') and urls relative to directory of page, which is relative
+    to output folder ('css/style.css', './css/style.css' or '../css/style.css' in 'blog/'), are rewritten.
+    """
+
+    buffer_started = False
+
+    def __init__(self, stream, assets, directory=''):
+        self.stream = stream
+        self.urls = {}
+        for relpath, hashed in assets.items():
+            self.urls['/' + relpath] = '/' + hashed
+            if directory:
+                relpath, hashed = posixpath.relpath(relpath, directory), posixpath.relpath(hashed, directory)
+            self.urls[relpath] = hashed
+            self.urls['./' + relpath] = './' + hashed
+        self.buffer = ''
+        # Longest url and one character after it for the lookahead.
+        self.keep = max(len(x) for x in self.urls) + 2 if assets else 0
+        alternatives = '|'.join(re.escape(x) for x in sorted(self.urls, key=len, reverse=True))
+        self.regex = re.compile(r'(?<![\w./-])(%s)(?![\w.-])' % alternatives) if assets else None
+
+    def replace(self, match):
+        return self.urls[match.group(1)]
+
+    def write(self, chunk):
+        if self.regex is None:
+            return self.stream.write(chunk)
+        self.buffer += chunk
+        # One already written character stays in front of buffer for the lookbehind.
+        safe = len(self.buffer) - self.keep
+        if safe > 1:
+            self.flush_until(safe)
+        return len(chunk)
+
+    def flush_until(self, safe):
+        position = 1 if self.buffer_started else 0
+        parts = []
+        for match in self.regex.finditer(self.buffer, position):
+            if match.start() >= safe:
+                break
+            parts.append(self.buffer[position:match.start()])
+            parts.append(self.replace(match))
+            position = match.end()
+        if position < safe:
+            parts.append(self.buffer[position:safe])
+            position = safe
+        self.stream.write(''.join(parts))
+        self.buffer = self.buffer[position - 1:]
+        self.buffer_started = True
+
+    def close(self):
+        """Rewrite and write rest of buffer."""
+        if self.regex is not None and len(self.buffer) > (1 if self.buffer_started else 0):
+            self.flush_until(len(self.buffer))
+        self.buffer = ''
+        self.buffer_started = False
@@ -1,201 +1,506 @@
+"""
+Build of site.
+
+Modules needed only by some commands or options (watcher, process pool, compression,
+http server) are imported where they are used, so plain build starts fast.
+"""
 import os
 import sys
 import time
-import threading
-import urllib.parse
-import posixpath
-from http.server import HTTPServer, SimpleHTTPRequestHandler
+import collections
 
 from template_engine.base import Collector
-from distutils.dir_util import copy_tree
-from watchcat import Watchcat
-
-NEW_INDEX_STR = """<!DOCTYPE html>
-<html>
-{# templates/header.html #}
-<body>
-  <h1>Welcome!</h1>
-  {# templates/nav.html #}
-</body>
-{# templates/footer.html #}
-</html>"""
-
-NEW_ABOUT_STR = """<!DOCTYPE html>
-<html>
-{# templates/header.html #}
-<body>
-  <h1>About!</h1>
-  {# templates/nav.html #}
-</body>
-{# templates/footer.html #}
-</html>"""
-
-NEW_HEADER_STR = """
-<head>
-  <title>My new site</title>
-  <link rel="stylesheet" href="/css/style.css" />
-</head>"""
-
-NEW_FOOTER_STR = """
-<footer>
-   <p><strong>Just example of footer</strong></p>
-   <p>&copy; Your name </p>
-</footer>"""
-
-NEW_NAV_STR = """
-  <ul>
-    <li>
-      <a href="/" class="active">Main</a>
-    </li>
-    <li>
-      <a href="/about.html" class="active">About</a>
-    </li>
-  </ul>"""
-
-NEW_STYLE_STR = """.active {font-weight:bold;}"""
-
-NEW_SITE = {
-    'index.html': NEW_INDEX_STR,
-    'about.html': NEW_ABOUT_STR,
-    'templates/header.html': NEW_HEADER_STR,
-    'templates/footer.html': NEW_FOOTER_STR,
-    'templates/nav.html': NEW_NAV_STR,
-    'css/style.css': NEW_STYLE_STR
-}
-
-
-def new_site(root='.', force=False):
-    """Create new site tree with template NEW_INDEX_STR, NEW_ABOUT_STR and etc."""
+from template_engine.loader import default_loader
+from template_engine.disk_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_SIZE, open_cache
+from manifest import BuildManifest
+from scaffold import NEW_SITE, new_site, open_file  # noqa: F401
+from assets import ASSET_DIRS, sync_assets, sync_file
+from fingerprint import ReferenceRewriter, fingerprint_assets
+from minify import HtmlMinifier
+from search import TextIndexer, read_header, remove_index, update_index
+from snapshots import create_snapshot, current_snapshot, discard_snapshot, prune_snapshots, publish_snapshot
+from discovery import DEFAULT_IGNORE, IgnorePatterns, find_pages, output_ignore
+from datasource import DATA_EXTENSIONS, DataBinding, DataBindingError, find_bindings, is_binding
+import profiler
+
+WRITE_BUFFER_SIZE = 64 * 1024
+
+
+def build_files(root='.', dest='site', force=False, watch=False, jobs=1, full=False, backend='tree',
+                gzip_level=None, link_assets=False, fingerprint=False, profile=False, profile_trace=None,
+                snapshots=None, ignore=(), minify=False, disk_cache=True, cache_size=DEFAULT_MAX_SIZE,
+                search=False):
+    """
+    Build all pages from template to site directory.
+
+    Only pages whose source or templates changed since the previous build are rendered,
+    unless full is True. backend selects how templates are rendered, 'tree' or 'codegen'.
+    If gzip_level is given, text files are precompressed into .gz files with this level.
+    Asset directories (ASSET_DIRS) are synced, with link_assets by hardlinks instead of copies.
+    With fingerprint assets get content hash in their names and pages refer to these names.
+    With profile timings of pages and build phases are printed, and saved as Chrome trace
+    into profile_trace if it is given.
+    Data bindings (*.data.json, see DataBinding) generate pages from records of data files.
+    With snapshots site is built into new version next to dest, made of hardlinks to the previous
+    one, and published by atomic swap of dest symlink, only snapshots newest versions are kept.
+    Snapshots can not be watched, watcher would change published version in place.
+    Pages are searched at any depth, except paths matching ignore globs and page_patterns.
+    With minify insignificant whitespace and comments are removed from pages while they are written.
+    With disk_cache resolved and compiled pages are kept in DEFAULT_CACHE_DIR of root between runs,
+    least recently used ones are removed when it grows over cache_size bytes.
+    With search words of pages are collected while they are written into search index, see search.py.
+    """
+    if watch:
+        check_watchable(root, dest, snapshots)
+    prof = profiler.enable() if profile or profile_trace else None
     if os.path.exists(os.path.join(root, 'index.html')):
-        if not force:
-            print("There are already index.html in the source folder.")
+        if os.path.exists(os.path.join(root, 'site')) and not force:
+            print("There are already exists folder. Try -F for rewrite.")
+            sys.exit(1)
+        elif not os.path.exists(os.path.join(root, 'site')) and not snapshots:
+            # snapshot is created instead
+            os.mkdir(dest)
+        files_for_building = find_pages(root, page_patterns(dest, ignore)) + find_bindings(root)
+        with profiler.span('snapshot'):
+            output = create_snapshot(root, dest) if snapshots else dest
+        # previous manifest is loaded even with full, it knows outputs of deleted pages
+        manifest = BuildManifest(root, output).load()
+        cache_dir = os.path.join(os.path.abspath(root), DEFAULT_CACHE_DIR) if disk_cache else None
+        errors, counts = update_site(manifest, files_for_building, output, root=root, jobs=jobs, full=full,
+                                     link_assets=link_assets, fingerprint=fingerprint, backend=backend,
+                                     url=dest, minify=minify, cache_dir=cache_dir, cache_size=cache_size,
+                                     search=search, profile=prof is not None)
+        if errors:
+            if snapshots:
+                discard_snapshot(root, output)
             sys.exit(1)
+        if cache_dir is not None:
+            open_cache(cache_dir, cache_size).prune()
+        if gzip_level is not None:
+            from compress import compress_tree
+            with profiler.span('compress'):
+                compress_tree(os.path.join(root, output), level=gzip_level)
+        if snapshots:
+            publish_snapshot(root, dest, output)
+            prune_snapshots(root, dest, snapshots)
+        if prof is not None:
+            prof.report()
+            if profile_trace:
+                prof.write_trace(profile_trace)
+                print("Trace saved to {0}".format(profile_trace))
+            profiler.disable()
+    else:
+        print("Sorry, index.html not found! Try to create new site, use for it 'new'")
+        sys.exit(1)
 
-    print("Creating new site in '{0}'".format(os.path.abspath(root)))
+    if watch:
+        watching(root, dest, jobs=jobs, backend=backend, gzip_level=gzip_level, link_assets=link_assets,
+                 fingerprint=fingerprint, ignore=ignore)
 
-    for filename, text in list(NEW_SITE.items()):
-        filepath = os.path.join(root, filename)
-        with open_file(filepath, "w", create_dir=True) as wfile:
-            wfile.write(text)
 
+def check_watchable(root='.', dest='site', snapshots=None):
+    """Exit if dest is built with snapshots, changes would be written into published snapshot."""
+    if snapshots or current_snapshot(root, dest) is not None:
+        print("Watching can not be used with snapshots, published snapshot would be changed in place.")
+        sys.exit(1)
 
-def open_file(path, mode='rb', create_dir=False, create_mode=0o755):
-    """Func for writing data while creating site."""
-    try:
-        newfile = open(path, mode)
-    except IOError:
-        if not create_dir:
-            raise
-        newfile = None
 
-    if not newfile:
-        filedir = os.path.split(path)[0]
-        os.makedirs(filedir, create_mode)
-        newfile = open(path, mode)
+def page_patterns(dest='site', ignore=()):
+    """Ignore patterns of page search: templates, top level asset folders, output folder and user globs."""
+    return IgnorePatterns(DEFAULT_IGNORE + tuple('/' + x + '/' for x in ASSET_DIRS) + output_ignore(dest) +
+                          tuple(ignore))
 
-    return newfile
 
+def update_site(manifest, filenames, destination, root='.', jobs=1, full=False, link_assets=False,
+                fingerprint=False, **options):
+    """
+    Bring destination up to date with source pages filenames.
 
-def build_files(root='.', dest='site', force=False, watch=False):
-    """Build all pages from template to site directory."""
-    if os.path.exists(os.path.join(root, 'index.html')):
-        if os.path.exists(os.path.join(root, 'site')) and not force:
-            print("There are already exists folder. Try -F for rewrite.")
-            sys.exit(1)
-        elif not os.path.exists(os.path.join(root, 'site')):
-            os.mkdir(dest)
-        files_for_building = [x for x in os.listdir(root) if x[-5:] == '.html']
-        for filename in files_for_building:
-            build_file(filename, dest)
-        stylesheet_dir = root + '/css'
-        copy_tree(stylesheet_dir, root + '/' + dest + '/css')
+    Outputs of pages which are gone are removed, assets are synced and fingerprinted,
+    pages which manifest reports outdated are built, with full all pages are built.
+    Search index can only be made from rendered pages, so all of them are built if it is missing.
+    Return result of update_pages.
+    """
+    for filename in manifest.removed_pages(filenames):
+        for page in manifest.outputs(filename):
+            remove_file(os.path.join(root, destination, page))
+        manifest.forget(filename)
+    with profiler.span('sync_assets'):
+        sync_assets(root, destination, link=link_assets, fingerprint=fingerprint)
+    with profiler.span('fingerprint'):
+        assets = fingerprint_assets(root, destination, ASSET_DIRS) if fingerprint else None
+    manifest.settings = {'assets': assets, 'minify': options.get('minify', False)}
+    output = os.path.join(root, destination)
+    if options.get('search'):
+        manifest.settings['search'] = True
+    elif manifest.previous_settings.get('search'):
+        remove_index(output)
+    if full or (options.get('search') and read_header(output) is None):
+        outdated = list(filenames)
     else:
-        print("Sorry, index.html not found! Try to create new site, use for it 'new'")
-        sys.exit(1)
+        outdated = manifest.outdated_pages(filenames)
+    return update_pages(manifest, outdated, destination, root=root, jobs=jobs, assets=assets, **options)
 
-    if watch:
-        watching(root, dest)
-
-
-def build_file(filename, destination, root='.'):
-    """There you can connect any template engine whatever you like."""
-    res = Collector(os.path.abspath(root), "/" + filename).assemble_page(destionation_url=str(destination))
-    with open(os.path.abspath(root) + "/" + destination + "/" + filename, 'w') as f:
-        f.write(res)
-
-
-def watching(root='./', dest='site'):
-    """There you can connect any watcher whatever you like."""
-    dirs_for_watching = [root, root + '/templates/', root + '/css/']
-    files_for_watching = []
-    for adress in dirs_for_watching:
-        files_in_dir = os.listdir(os.path.realpath(adress))
-        files_for_watching += [os.path.realpath(adress + x) for x in files_in_dir \
-            if os.path.isfile(adress + x) and (x[-5:] == '.html' or x[-4:] == '.css')]
-    watchcat = Watchcat(*files_for_watching)
-    watching_thread = threading.Thread(target=watchcat.run_watching())
-    watching_thread.start()
+
+def update_pages(manifest, filenames, destination, root='.', jobs=1, executor=None, **options):
+    """
+    Build pages and data bindings, store their dependencies in manifest and print errors.
+
+    With search=True in options words of built pages replace their previous ones in search index.
+    executor is a pool of jobs workers which is kept between builds, see run_jobs.
+    Return list of (filename, error) and Counter of built, written and minified pages.
+    """
+    pages = [x for x in filenames if not is_binding(x)]
+    dependencies, errors, counts, texts = build_pages(pages, destination, root=root, jobs=jobs, executor=executor,
+                                                      **options)
+    for filename, deps in dependencies.items():
+        manifest.record(filename, deps)
+    for filename, error in errors:
+        manifest.forget(filename)
+    for name in filenames:
+        if is_binding(name):
+            deps, outputs, binding_errors, binding_counts, binding_texts = build_data_pages(
+                name, destination, root=root, jobs=jobs, executor=executor, **options)
+            counts.update(binding_counts)
+            texts.update(binding_texts)
+            stale = set(manifest.generated.get(name, [])) - set(outputs)
+            if binding_errors:
+                # keep previous outputs until binding is built successfully
+                manifest.forget(name)
+                manifest.generated[name] = outputs + sorted(stale)
+                errors.extend(binding_errors)
+                continue
+            for output in stale:
+                remove_file(os.path.join(root, destination, output))
+            manifest.record(name, deps, outputs)
+    for filename, error in errors:
+        print("Error while building {0}:\n{1}".format(filename, error))
+    if counts['built']:
+        print("Written {0} pages, skipped {1} unchanged".format(
+            counts['written'], counts['built'] - counts['written']))
+    if counts['minified']:
+        print("Minified away {0} bytes".format(counts['minified']))
+    if options.get('search'):
+        with profiler.span('search_index'):
+            update_index(os.path.join(root, destination), texts)
+    manifest.save()
+    return errors, counts
+
+
+def rebuild_changed(changes, root='.', dest='site', jobs=1, backend='tree', gzip_level=None,
+                    link_assets=False, fingerprint=False, ignore=(), manifest=None, executor=None):
+    """
+    Rebuild only outputs affected by changed source files.
+
+    Changed page is rebuilt itself, changed template rebuilds pages which include
+    or extend it, changed asset is just copied. If fingerprint of asset changed,
+    all pages are rebuilt. manifest of dest is loaded unless it is given, executor is passed to update_pages.
+    Return result of update_pages.
+    """
+    started = time.time()
+    manifest = manifest if manifest is not None else BuildManifest(root, dest).load()
+    root_path = os.path.realpath(root)
+    patterns = page_patterns(dest, ignore)
+    pages, assets = set(), set()
+    for path in changes:
+        relpath = os.path.relpath(os.path.realpath(path), root_path)
+        if relpath.split(os.sep)[0] in ASSET_DIRS:
+            assets.add(relpath)
+        else:
+            pages.update(manifest.dependents(relpath))
+            if relpath[-5:] == '.html' and not patterns.is_ignored(relpath, is_dir=False):
+                pages.add(relpath)
+            elif os.path.dirname(relpath) == '' and is_binding(relpath):
+                pages.add(relpath)
+    for relpath in sorted(assets):
+        sync_file(os.path.join(root, relpath), os.path.join(root, dest, relpath), link=link_assets)
+    fingerprints = manifest.settings.get('assets')
+    if fingerprint and assets:
+        fingerprints = fingerprint_assets(root, dest, ASSET_DIRS)
+        if fingerprints != manifest.settings.get('assets'):
+            manifest.settings = dict(manifest.settings, assets=fingerprints)
+            pages.update(manifest.pages)
+    for filename in sorted(pages):
+        if not os.path.exists(os.path.join(root, filename)):
+            for output in manifest.outputs(filename):
+                remove_file(os.path.join(root, dest, output))
+            manifest.forget(filename)
+            pages.discard(filename)
+    result = update_pages(manifest, sorted(pages), dest, root=root, jobs=jobs, executor=executor, backend=backend,
+                          assets=fingerprints, minify=manifest.settings.get('minify', False),
+                          search=manifest.settings.get('search', False))
+    if gzip_level is not None:
+        from compress import compress_tree
+        compress_tree(os.path.join(root, dest), level=gzip_level)
+    print("Rebuilt {0} pages and {1} assets in {2:.3f}s".format(
+        len(pages), len(assets), time.time() - started))
+    return result
+
+
+def make_executor(jobs, fresh_workers=False):
+    """
+    Process pool for page rendering, thread pool where processes are unavailable.
+
+    With fresh_workers workers are started by forkserver or spawn instead of fork, so pool
+    of a threaded process does not copy its held locks, and they leave SIGINT and SIGTERM
+    to the process which owns the pool.
+    """
+    import concurrent.futures
+    options = {}
+    if fresh_workers:
+        import multiprocessing
+        methods = multiprocessing.get_all_start_methods()
+        method = 'forkserver' if 'forkserver' in methods else 'spawn'
+        options = {'mp_context': multiprocessing.get_context(method), 'initializer': _init_worker}
     try:
-        num_changes = 0
-        while True:
-            time.sleep(0.5)
-            if num_changes < watchcat.num_changes:
-                build_files(root=root, dest=dest, force=True)
-                num_changes = watchcat.num_changes
-    except KeyboardInterrupt:
-        watching_thread.join()
+        return concurrent.futures.ProcessPoolExecutor(max_workers=jobs, **options)
+    except (ImportError, NotImplementedError, OSError):
+        return concurrent.futures.ThreadPoolExecutor(max_workers=jobs)
+
 
+def _init_worker():
+    import signal
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
 
-def serve_files(root='.', dest='site', watch=False, port=8000, force=False):
+
+def build_pages(filenames, destination, root='.', jobs=1, executor=None, **options):
     """
-    Simple and all used example of HttpServer.
+    Build pages serially or in a pool of jobs workers, options are passed to build_file.
 
-    If you saw one, you will understand and this.
+    Return dict of dependencies of built pages, list of (filename, error)
+    in order of filenames, so both modes report the same, Counter of built and written pages
+    and dict of (title, terms) of pages built with search.
+    Every worker process keeps its own warm template cache.
+    With profile=True in options, profiler events of workers are merged into active profiler.
+    """
+    jobs_args = ((filename, destination, root, options) for filename in filenames)
+    results = run_jobs(jobs_args, jobs if len(filenames) > 1 else 1, executor)
+    dependencies = {}
+    errors = []
+    counts = collections.Counter()
+    texts = {}
+    for filename, (result, error) in zip(filenames, results):
+        if error:
+            errors.append((filename, error))
+        else:
+            dependencies[filename], written, saved, text = result
+            counts.update(built=1, written=int(written), minified=saved)
+            if text is not None:
+                texts[filename] = text
+    return dependencies, errors, counts, texts
+
+
+def build_data_pages(name, destination, root='.', jobs=1, executor=None, **options):
     """
-    class RequestHandler(SimpleHTTPRequestHandler):
+    Build pages of data binding name, records are read lazily while pages are built.
 
-        def translate_path(self, path):
+    Return (dependencies, output names, list of (name, error), Counter of built and written pages,
+    dict of (title, terms) of pages built with search).
+    """
+    counts = collections.Counter()
+    texts = {}
+    try:
+        binding = DataBinding.load(root, name)
+    except DataBindingError as e:
+        return [name], [], [(name, str(e))], counts, texts
+    dependencies = set(binding.dependencies)
+    outputs = []
+    errors = []
+
+    def jobs_args():
+        try:
+            for output, context in binding.pages(root):
+                outputs.append(output)
+                yield output, destination, root, dict(options, template=binding.template, context=context)
+        except (DataBindingError, IOError, UnicodeError) as e:
+            errors.append((name, str(e)))
+
+    for index, (result, error) in enumerate(run_jobs(jobs_args(), jobs, executor)):
+        if error:
+            errors.append((outputs[index], error))
+        else:
+            deps, written, saved, text = result
+            dependencies.update(deps)
+            counts.update(built=1, written=int(written), minified=saved)
+            if text is not None:
+                texts[outputs[index]] = text
+    return sorted(dependencies), outputs, errors, counts, texts
+
+
+def run_jobs(jobs_args, jobs=1, executor=None):
+    """
+    Yield results of _build_file_job for every tuple of arguments, in order.
+
+    Arguments are consumed lazily, at most a few pages per worker are in flight.
+    Pages are built in executor if it is given, otherwise in a pool made for this call.
+    Profiler events of workers are merged into active profiler.
+    """
+    if jobs <= 1:
+        results = (_build_file_job(*args) for args in jobs_args)
+    else:
+        results = _run_in_pool(jobs_args, jobs, executor)
+    for result, error, (events, caches) in results:
+        if events:
+            profiler.active.add_events(events, caches)
+        yield result, error
+
+
+def _run_in_pool(jobs_args, jobs, executor=None):
+    if executor is None:
+        with make_executor(jobs) as executor:
+            yield from _run_in_pool(jobs_args, jobs, executor)
+        return
+    pending = collections.deque()
+    for args in jobs_args:
+        pending.append(executor.submit(_build_file_job, *args))
+        if len(pending) >= jobs * 4:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _build_file_job(filename, destination, root='.', options=None):
+    """Build one page and return (result of build_file, formatted error, profiler events) instead of raising."""
+    options = dict(options or {})
+    prof = profiler.enable() if options.pop('profile', False) else None
+    if prof is not None:
+        prof.start_local()
+    try:
+        return build_file(filename, destination, root=root, **options), None, _stop_profiling(prof)
+    except Exception as e:
+        import traceback
+        return None, ''.join(traceback.format_exception_only(type(e), e)).strip(), _stop_profiling(prof)
 
-            root = os.path.join(os.getcwd(), dest)
-            path = path.split('?', 1)[0]
-            path = path.split('#', 1)[0]
-            path = posixpath.normpath(urllib.parse.unquote(path))
-            words = path.split('/')
-            words = [_f for _f in words if _f]
-            path = root
-            for word in words:
-                drive, word = os.path.splitdrive(word)
-                head, word = os.path.split(word)
-                if word in (os.curdir, os.pardir):
-                    continue
-                path = os.path.join(path, word)
-            print(path)
-            return path
 
-    class SimpleHTTPServer(HTTPServer):
+def _stop_profiling(prof):
+    return prof.stop_local() if prof is not None else (None, None)
 
-        def serve(self):
-            self._stopped = False
-            while not self._stopped:
-                try:
-                    httpd.handle_request()
-                except:
-                    self._stopped = True
-                    self.server_close()
 
-        def shutdown(self):
-            self._stopped = True
-            self.server_close()
+def build_file(filename, destination, root='.', backend='tree', assets=None, template=None, context=None,
+               url=None, minify=False, cache_dir=None, cache_size=DEFAULT_MAX_SIZE, search=False):
+    """
+    There you can connect any template engine whatever you like.
+
+    assets maps asset urls to fingerprinted ones, they are replaced while page is written.
+    Page is rendered from template (filename by default) with extra variables from context,
+    destionation_url is url or destination.
+    It is written into temporary file which atomically replaces output only if content changed,
+    so unchanged outputs keep their mtime and readers never see half-written page.
+    With minify page goes through HtmlMinifier on the way to file.
+    cache_dir is folder of persistent DiskCache of compiled pages, no cache is used if it is None.
+    With search words of page are collected by TextIndexer while it is written.
+    Return list of source files the page was assembled from, whether output was written,
+    number of bytes removed by minifier and (title, terms) of page or None without search.
+    """
+    disk_cache = open_cache(cache_dir, cache_size) if cache_dir else None
+    collector = Collector(os.path.abspath(root), "/" + (template or filename), backend=backend,
+                          disk_cache=disk_cache)
+    path = os.path.abspath(root) + "/" + destination + "/" + filename
+    if os.path.dirname(filename):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = os.path.join(os.path.dirname(path), '.' + os.path.basename(filename) + '.tmp')
+    try:
+        with profiler.span('build_file', page=filename) as span:
+            with open(tmp_path, 'w', buffering=WRITE_BUFFER_SIZE) as f:
+                timed = profiler.TimedStream(f) if profiler.active is not None else None
+                stream = timed or f
+                rewriter = stream = ReferenceRewriter(stream, assets, os.path.dirname(filename)) if assets else stream
+                minifier = stream = HtmlMinifier(stream) if minify else stream
+                indexer = stream = TextIndexer(stream) if search else stream
+                collector.assemble_page_to(stream, destionation_url=str(destination if url is None else url),
+                                           **(context or {}))
+                if search:
+                    indexer.close()
+                if minify:
+                    minifier.close()
+                if assets:
+                    rewriter.close()
+                if timed is not None:
+                    span['write_time'] = timed.time
+            written = replace_if_changed(tmp_path, path)
+    except BaseException:
+        remove_file(tmp_path)
+        raise
+    text = (indexer.title, indexer.terms) if search else None
+    return collector.dependencies, written, minifier.saved if minify else 0, text
+
+
+def replace_if_changed(tmp_path, path):
+    """Move tmp_path over path unless both have the same content. Return True if path was replaced."""
+    if is_same_content(tmp_path, path):
+        os.remove(tmp_path)
+        return False
+    os.replace(tmp_path, path)
+    return True
+
+
+def is_same_content(first, second):
+    """Compare sizes, then contents chunk by chunk."""
+    try:
+        if os.path.getsize(first) != os.path.getsize(second):
+            return False
+        with open(first, 'rb') as a, open(second, 'rb') as b:
+            while True:
+                chunk = a.read(WRITE_BUFFER_SIZE)
+                if chunk != b.read(WRITE_BUFFER_SIZE):
+                    return False
+                if not chunk:
+                    return True
+    except OSError:
+        return False
+
+
+def remove_file(path):
+    """Remove output file, which source was deleted."""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
 
-    server_address = ('', port)
-    httpd = SimpleHTTPServer(server_address, RequestHandler)
-    server_thread = threading.Thread(target=httpd.serve)
-    server_thread.daemon = True
-    server_thread.start()
+def watching(root='./', dest='site', jobs=1, backend='tree', on_change=None, gzip_level=None,
+             link_assets=False, fingerprint=False, ignore=()):
+    """
+    There you can connect any watcher whatever you like.
 
-    print("HTTP server started on port {0}".format(server_address[1]))
+    Source tree is watched recursively, except output folder, hidden files, paths matching
+    ignore globs and files which are neither html, data nor assets. Changed files are passed
+    to on_change, by default affected pages are rebuilt.
+    """
+    from watchcat import create_watchcat
+    root_path = os.path.realpath(root)
+    dest_path = os.path.realpath(os.path.join(root, dest))
+    patterns = IgnorePatterns(('.*', '*.tmp') + output_ignore(dest) + tuple(ignore))
+
+    def is_ignored(path):
+        path = os.path.realpath(path)
+        relpath = os.path.relpath(path, root_path)
+        extension = os.path.splitext(path)[1]
+        in_assets = relpath.split(os.sep)[0] in ASSET_DIRS
+        inside = relpath != os.curdir and not relpath.startswith(os.pardir)
+        return ((inside and patterns.is_ignored(relpath)) or
+                path == dest_path or path.startswith(dest_path + os.sep) or
+                (extension and extension != '.html' and extension not in DATA_EXTENSIONS and not in_assets))
+
+    watchcat = create_watchcat(os.path.realpath(root), ignore=is_ignored)
+    watchcat.run_watching()
+    try:
+        while True:
+            changes = watchcat.wait_changes(timeout=0.5)
+            if changes:
+                default_loader.invalidate(*changes)
+                if on_change is not None:
+                    on_change(changes)
+                else:
+                    rebuild_changed(changes, root=root, dest=dest, jobs=jobs, backend=backend,
+                                    gzip_level=gzip_level, link_assets=link_assets, fingerprint=fingerprint,
+                                    ignore=ignore)
+    except KeyboardInterrupt:
+        watchcat.stop_watching()
 
-    build_files(root=root, dest=dest, force=True)
 
-    if watch:
-        watching(root, dest)
+def serve_files(*args, **kwargs):
+    """Serve site, see server.serve_files."""
+    from server import serve_files
+    return serve_files(*args, **kwargs)
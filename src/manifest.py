@@ -0,0 +1,134 @@
+import os
+import json
+import hashlib
+
+MANIFEST_NAME = '.tssg-manifest.json'
+MANIFEST_VERSION = 1
+
+
+def write_json(path, data):
+    """Write data into temporary file and move it over path, file is never seen half-written."""
+    tmp_path = os.path.join(os.path.dirname(path), '.' + os.path.basename(path) + '.tmp')
+    with open(tmp_path, 'w') as file:
+        json.dump(data, file, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def file_hash(path):
+    """Sha1 of file content."""
+    sha = hashlib.sha1()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(65536), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+class BuildManifest(object):
+    """Dependency graph of built pages with content hashes of all sources.
+
+    Saved in the output directory, it lets next build re-render only pages
+    whose own source or any of included or parent templates were changed.
+    """
+
+    def __init__(self, root, dest):
+        self.root = root
+        self.dest = dest
+        self.pages = {}
+        self.files = {}
+        self.settings = {}
+        self.previous_settings = {}
+        self.generated = {}
+        self._states = {}
+
+    @property
+    def path(self):
+        return os.path.join(self.root, self.dest, MANIFEST_NAME)
+
+    def load(self):
+        """Read previous manifest, silently start from scratch if it is unusable."""
+        try:
+            with open(self.path, 'r') as file:
+                data = json.load(file)
+        except (IOError, ValueError):
+            return self
+        if data.get('version') != MANIFEST_VERSION:
+            return self
+        self.pages = {k: list(v) for k, v in data.get('pages', {}).items()}
+        self.files = {k: list(v) for k, v in data.get('files', {}).items()}
+        self.settings = self.previous_settings = data.get('settings', {})
+        self.generated = {k: list(v) for k, v in data.get('generated', {}).items()}
+        return self
+
+    def save(self):
+        files = {}
+        for deps in self.pages.values():
+            for dep in deps:
+                state = self.file_state(dep)
+                if state is not None:
+                    files[dep] = state
+        data = {'version': MANIFEST_VERSION, 'pages': self.pages, 'files': files, 'settings': self.settings,
+                'generated': self.generated}
+        write_json(self.path, data)
+        # saved state is the baseline of the next build with the same instance
+        self.files = files
+        self.previous_settings = self.settings
+        self._states = {}
+
+    def file_state(self, relpath):
+        """[mtime_ns, size, sha1] of source file, content is hashed only if stat changed."""
+        if relpath in self._states:
+            return self._states[relpath]
+        try:
+            st = os.stat(os.path.join(self.root, relpath))
+        except OSError:
+            state = None
+        else:
+            old = self.files.get(relpath)
+            if old and old[0] == st.st_mtime_ns and old[1] == st.st_size:
+                state = old
+            else:
+                state = [st.st_mtime_ns, st.st_size, file_hash(os.path.join(self.root, relpath))]
+        self._states[relpath] = state
+        return state
+
+    def is_changed(self, relpath):
+        state = self.file_state(relpath)
+        old = self.files.get(relpath)
+        return state is None or old is None or state[2] != old[2]
+
+    def outputs(self, page):
+        """Output files of page, data binding produces many of them."""
+        return self.generated.get(page, [page])
+
+    def is_outdated(self, page):
+        """Page needs rebuilding if it is new, any of its outputs is missing or any dependency changed."""
+        if page not in self.pages:
+            return True
+        if not all(os.path.exists(os.path.join(self.root, self.dest, x)) for x in self.outputs(page)):
+            return True
+        return any(self.is_changed(dep) for dep in self.pages[page])
+
+    def outdated_pages(self, pages):
+        """Pages to rebuild, all of them if settings which affect output changed."""
+        if self.settings != self.previous_settings:
+            return list(pages)
+        return [page for page in pages if self.is_outdated(page)]
+
+    def removed_pages(self, pages):
+        """Pages from previous build whose source is gone."""
+        current = set(pages)
+        return sorted(page for page in set(self.pages) | set(self.generated) if page not in current)
+
+    def dependents(self, relpath):
+        """Pages which depend on file relpath."""
+        relpath = os.path.normpath(relpath)
+        return sorted(page for page, deps in self.pages.items() if relpath in deps)
+
+    def record(self, page, dependencies, outputs=None):
+        self.pages[page] = sorted(set(os.path.normpath(dep) for dep in dependencies))
+        if outputs is not None:
+            self.generated[page] = outputs
+
+    def forget(self, page):
+        self.pages.pop(page, None)
+        self.generated.pop(page, None)
@@ -0,0 +1,56 @@
+import os
+import hashlib
+import posixpath
+import threading
+import urllib.parse
+
+from template_engine.base import Collector
+
+
+class InMemorySite(object):
+    """Pages rendered on first request and kept in memory until their sources change."""
+
+    def __init__(self, root='.', dest='site', backend='tree', patterns=None):
+        self.root = os.path.abspath(root)
+        self.dest = dest
+        self.backend = backend
+        self.patterns = patterns
+        self.pages = {}
+        self._lock = threading.Lock()
+
+    def page_name(self, url):
+        """Source page for url path or None if url is not a page or matches ignore patterns."""
+        path = url.split('?', 1)[0].split('#', 1)[0]
+        path = posixpath.normpath(urllib.parse.unquote(path)).lstrip('/')
+        if path in ('', '.'):
+            path = 'index.html'
+        elif url.split('?', 1)[0].endswith('/'):
+            path = posixpath.join(path, 'index.html')
+        if path[-5:] != '.html' or path.startswith('..'):
+            return None
+        if self.patterns is not None and self.patterns.is_ignored(path, is_dir=False):
+            return None
+        return path
+
+    def get(self, filename):
+        """Return (content bytes, etag) of page, render it if it is not cached yet."""
+        with self._lock:
+            entry = self.pages.get(filename)
+        if entry is not None:
+            return entry[0], entry[1]
+        if not os.path.isfile(os.path.join(self.root, filename)):
+            return None
+        collector = Collector(self.root, '/' + filename, backend=self.backend)
+        content = collector.assemble_page(destionation_url=str(self.dest)).encode('utf-8')
+        etag = '"{0}"'.format(hashlib.sha1(content).hexdigest()[:20])
+        with self._lock:
+            self.pages[filename] = (content, etag, set(collector.dependencies))
+        return content, etag
+
+    def invalidate(self, changes):
+        """Forget pages which depend on any of changed files."""
+        relpaths = set(os.path.relpath(os.path.realpath(x), os.path.realpath(self.root)) for x in changes)
+        with self._lock:
+            for filename in list(self.pages):
+                if filename in relpaths or self.pages[filename][2] & relpaths:
+                    del self.pages[filename]
@@ -0,0 +1,123 @@
+import re
+
+RAW_TAGS = ('pre', 'textarea', 'script', 'style')
+WHITESPACE_REGEX = re.compile(r'[ \t\n\r\f]+')
+TAG_REGEX = re.compile(r'<[/!]?[a-zA-Z][^>"\']*(?:(?:"[^"]*"|\'[^\']*\')[^>"\']*)*>')
+TAG_NAME_REGEX = re.compile(r'<([a-zA-Z][\w-]*)')
+TAG_START_REGEX = re.compile(r'<[/!a-zA-Z]')
+CLOSING_REGEXES = {x: re.compile('</' + x, re.IGNORECASE) for x in RAW_TAGS}
+HTML_WHITESPACE = ' \t\n\r\f'
+
+
+def collapse_whitespace(text):
+    """Replace every run of whitespace by newline if it has one, by space otherwise."""
+    return WHITESPACE_REGEX.sub(lambda m: '\n' if '\n' in m.group() else ' ', text)
+
+
+class HtmlMinifier(object):
+    """
+    Writable stream which minifies html on the way to another stream.
+
+    Runs of whitespace between and inside text are collapsed, comments except
+    conditional ones are dropped. Tags are passed unchanged, content of pre, textarea,
+    script and style is not touched. Text is scanned once, only unfinished
+    tag, comment or trailing whitespace is held back between chunks.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.buffer = ''
+        self.raw_tag = None
+        self.in_comment = False
+        self.keep_comment = False
+        self.saved = 0
+
+    def write(self, chunk):
+        self.buffer += chunk
+        self.process(final=False)
+        return len(chunk)
+
+    def close(self):
+        """Flush held back text, stream itself is not closed."""
+        self.process(final=True)
+
+    def emit(self, text):
+        if text:
+            self.stream.write(text)
+
+    def skip_comment(self, text):
+        if self.keep_comment:
+            self.emit(text)
+        else:
+            self.saved += len(text.encode('utf-8'))
+
+    def emit_text(self, text):
+        collapsed = collapse_whitespace(text)
+        self.saved += len(text) - len(collapsed)
+        self.emit(collapsed)
+
+    def process(self, final):
+        buffer = self.buffer
+        position = 0
+        while position < len(buffer):
+            if self.in_comment:
+                end = buffer.find('-->', position)
+                if end < 0:
+                    keep = len(buffer) if final else max(len(buffer) - 2, position)
+                    self.skip_comment(buffer[position:keep])
+                    position = keep
+                    break
+                self.skip_comment(buffer[position:end + 3])
+                position = end + 3
+                self.in_comment = False
+            elif self.raw_tag is not None:
+                closing = CLOSING_REGEXES[self.raw_tag].search(buffer, position)
+                if closing is None:
+                    keep = len(buffer) if final else max(len(buffer) - len(self.raw_tag) - 1, position)
+                    self.emit(buffer[position:keep])
+                    position = keep
+                    break
+                self.emit(buffer[position:closing.start()])
+                position = closing.start()
+                self.raw_tag = None
+            else:
+                start = buffer.find('<', position)
+                if start < 0:
+                    if final:
+                        self.emit_text(buffer[position:])
+                        position = len(buffer)
+                    else:
+                        end = max(len(buffer.rstrip(HTML_WHITESPACE)), position)
+                        self.emit_text(buffer[position:end])
+                        position = end
+                    break
+                self.emit_text(buffer[position:start])
+                position = start
+                if len(buffer) - start < 4 and not final:
+                    break
+                if buffer.startswith('<!--', start):
+                    if len(buffer) - start < 7 and not final:
+                        break
+                    self.in_comment = True
+                    self.keep_comment = buffer.startswith('<!--[if', start)
+                    self.skip_comment('<!--')
+                    position = start + 4
+                    continue
+                if not TAG_START_REGEX.match(buffer, start):
+                    self.emit('<')
+                    position = start + 1
+                    continue
+                match = TAG_REGEX.match(buffer, start)
+                if match is None:
+                    if not final:
+                        break
+                    self.emit(buffer[start:])
+                    position = len(buffer)
+                    break
+                tag = match.group()
+                self.emit(tag)
+                position = match.end()
+                name = TAG_NAME_REGEX.match(tag)
+                if name and name.group(1).lower() in RAW_TAGS and not tag.endswith('/>'):
+                    self.raw_tag = name.group(1).lower()
+        self.buffer = buffer[position:]
@@ -0,0 +1,223 @@
+import os
+import json
+import time
+import functools
+import threading
+import contextlib
+
+from template_engine.base import Collector, Compiler, Template
+from template_engine.cache import template_cache
+from template_engine.lexer import tokenize
+from template_engine.loader import default_loader
+from template_engine.disk_cache import opened_caches
+
+active = None
+
+INSTRUMENTED = (
+    (Collector, 'prepare_page', 'prepare_page'),
+    (Collector, 'prepare_include_tags', 'prepare_include_tags'),
+    (Compiler, 'compile', 'compile'),
+    (Template, 'render', 'render'),
+    (Template, 'render_to', 'render')
+)
+
+
+class Event(object):
+    """Timed span of build."""
+
+    __slots__ = ('name', 'start', 'duration', 'pid', 'tid', 'args')
+
+    def __init__(self, name, start, duration, args=None):
+        self.name = name
+        self.start = start
+        self.duration = duration
+        self.pid = os.getpid()
+        self.tid = threading.get_ident()
+        self.args = args or {}
+
+
+class TimedStream(object):
+    """Stream wrapper which sums time spent in write."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.time = 0.0
+
+    def write(self, chunk):
+        started = time.perf_counter()
+        result = self.stream.write(chunk)
+        self.time += time.perf_counter() - started
+        return result
+
+
+class Profiler(object):
+    """
+    Collect per-page and per-phase timings of build.
+
+    Template engine methods are wrapped only while profiler is installed,
+    so a build without profiling runs the original code.
+    """
+
+    def __init__(self):
+        self.events = []
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._originals = []
+        self.worker_caches = {}
+
+    def install(self):
+        for cls, method, name in INSTRUMENTED:
+            original = cls.__dict__[method]
+            self._originals.append((cls, method, original))
+            setattr(cls, method, self.timed(name, original))
+
+    def uninstall(self):
+        for cls, method, original in reversed(self._originals):
+            setattr(cls, method, original)
+        self._originals = []
+
+    def timed(self, name, func):
+        """Wrap func, recursive calls are counted once."""
+        depth = threading.local()
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if getattr(depth, 'inside', False):
+                return func(*args, **kwargs)
+            depth.inside = True
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                depth.inside = False
+                self.record(name, started, time.perf_counter())
+        return wrapper
+
+    @contextlib.contextmanager
+    def span(self, name, **args):
+        started = time.perf_counter()
+        try:
+            yield args
+        finally:
+            self.record(name, started, time.perf_counter(), args)
+
+    def record(self, name, started, finished, args=None):
+        event = Event(name, started, finished - started, args)
+        events = getattr(self._local, 'events', None)
+        if events is not None:
+            events.append(event)
+        else:
+            with self._lock:
+                self.events.append(event)
+
+    def start_local(self):
+        """Collect events of current thread separately, e.g. for sending them from worker."""
+        self._local.events = []
+
+    def stop_local(self):
+        """Return (events, cache counters) collected since start_local."""
+        events, self._local.events = self._local.events, None
+        return events, cache_counters()
+
+    def add_events(self, events, caches=None):
+        """Merge events of worker, caches of worker processes are summed in report."""
+        with self._lock:
+            self.events.extend(events)
+            if caches is not None and events and events[0].pid != os.getpid():
+                self.worker_caches[events[0].pid] = caches
+
+    def phase_times(self):
+        """Self time of every phase, nested spans are subtracted from their parents."""
+        totals = {}
+        threads = {}
+        for event in self.events:
+            threads.setdefault((event.pid, event.tid), []).append(event)
+        for events in threads.values():
+            events.sort(key=lambda x: (x.start, -x.duration))
+            stack = []
+            for event in events:
+                while stack and stack[-1][0].start + stack[-1][0].duration <= event.start:
+                    parent, children = stack.pop()
+                    totals[parent.name] = totals.get(parent.name, 0.0) + parent.duration - children
+                if stack:
+                    stack[-1][1] += event.duration
+                stack.append([event, 0.0])
+            while stack:
+                parent, children = stack.pop()
+                totals[parent.name] = totals.get(parent.name, 0.0) + parent.duration - children
+        writes = sum(x.args.get('write_time', 0.0) for x in self.events)
+        if writes:
+            totals['write'] = writes
+            totals['render'] = totals.get('render', 0.0) - writes
+        return totals
+
+    def report(self, top=10):
+        pages = sorted((x for x in self.events if x.name == 'build_file'), key=lambda x: -x.duration)
+        print("Build profile: {0} pages in {1:.3f}s".format(len(pages), time.perf_counter() - self.started))
+        print("Slowest pages:")
+        for event in pages[:top]:
+            print("  {0:>9.3f}ms  {1}".format(event.duration * 1000, event.args.get('page')))
+        print("Phases:")
+        for name, value in sorted(self.phase_times().items(), key=lambda x: -x[1]):
+            print("  {0:>9.3f}ms  {1}".format(value * 1000, name))
+        print("Caches:")
+        totals = cache_counters()
+        for caches in self.worker_caches.values():
+            for name, (hits, misses) in caches.items():
+                totals[name] = (totals[name][0] + hits, totals[name][1] + misses)
+        for name, (hits, misses) in totals.items():
+            total = hits + misses
+            print("  {0:<10} {1:>6.1%} hits ({2} of {3})".format(name, hits / total if total else 0.0, hits, total))
+
+    def write_trace(self, path):
+        """Write events in Chrome trace_event format (chrome://tracing, Perfetto)."""
+        trace = [{
+            'name': event.name,
+            'cat': 'build',
+            'ph': 'X',
+            'ts': (event.start - self.started) * 1e6,
+            'dur': event.duration * 1e6,
+            'pid': event.pid,
+            'tid': event.tid,
+            'args': event.args
+        } for event in self.events]
+        with open(path, 'w') as file:
+            json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms'}, file)
+
+
+def cache_counters():
+    """(hits, misses) of template engine caches in this process."""
+    templates = template_cache.stats()
+    sources = default_loader.stats()
+    lexer = tokenize.cache_info()
+    disk = [x.stats() for x in opened_caches()]
+    return {
+        'templates': (templates['hits'], templates['misses']),
+        'sources': (sources['hits'], sources['misses']),
+        'lexer': (lexer.hits, lexer.misses),
+        'disk': (sum(x['hits'] for x in disk), sum(x['misses'] for x in disk))
+    }
+
+
+def enable():
+    """Install profiler in this process, return already installed one if any."""
+    global active
+    if active is None:
+        active = Profiler()
+        active.install()
+    return active
+
+
+def disable():
+    global active
+    if active is not None:
+        active.uninstall()
+        active = None
+
+
+def span(name, **args):
+    """Timed span if profiler is enabled, no-op otherwise."""
+    if active is None:
+        return contextlib.nullcontext(args)
+    return active.span(name, **args)
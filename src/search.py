@@ -0,0 +1,334 @@
+"""
+Full text search index of built pages.
+
+Index is written next to pages as two files: small JSON header INDEX_NAME.json with
+page urls, titles and offsets of term blocks, and binary postings INDEX_NAME.bin.
+Terms are sorted and front coded, every BLOCK_SIZE-th term starts a block which can be
+decoded alone. Every term is followed by page ids and word positions, both delta encoded
+as unsigned LEB128 varints:
+
+    shared prefix length, suffix length, suffix (utf-8), number of pages,
+    then for every page: id delta, number of positions, position deltas
+"""
+import os
+import re
+import html
+import json
+import bisect
+
+from minify import CLOSING_REGEXES, TAG_NAME_REGEX, TAG_REGEX, TAG_START_REGEX
+
+INDEX_NAME = 'search-index'
+INDEX_VERSION = 1
+BLOCK_SIZE = 128
+SKIPPED_TAGS = ('script', 'style')
+WORD_REGEX = re.compile(r'\w+')
+TRAILING_REGEX = re.compile(r'\S*\Z')
+
+
+def encode_varint(value, data):
+    """Append unsigned LEB128 value to bytearray data."""
+    while value > 0x7f:
+        data.append((value & 0x7f) | 0x80)
+        value >>= 7
+    data.append(value)
+
+
+def decode_varint(data, offset):
+    """Return (value, offset after it)."""
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+class TextIndexer(object):
+    """
+    Writable stream which collects words of html on the way to another stream.
+
+    Text outside of tags is split into lowercase words, entities are decoded,
+    comments and content of script and style are skipped. terms maps every word
+    to its positions in page, title is text of <title>.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.buffer = ''
+        self.skip_tag = None
+        self.in_comment = False
+        self.in_title = False
+        self.title_parts = []
+        self.terms = {}
+        self.count = 0
+
+    @property
+    def title(self):
+        return ' '.join(''.join(self.title_parts).split())
+
+    def write(self, chunk):
+        self.stream.write(chunk)
+        self.buffer += chunk
+        self.process(final=False)
+        return len(chunk)
+
+    def close(self):
+        """Index held back text, stream itself is not closed."""
+        self.process(final=True)
+
+    def add_text(self, text):
+        if not text:
+            return
+        text = html.unescape(text)
+        if self.in_title:
+            self.title_parts.append(text)
+        terms = self.terms
+        for match in WORD_REGEX.finditer(text):
+            terms.setdefault(match.group().lower(), []).append(self.count)
+            self.count += 1
+
+    def process(self, final):
+        buffer = self.buffer
+        position = 0
+        while position < len(buffer):
+            if self.in_comment:
+                end = buffer.find('-->', position)
+                if end < 0:
+                    position = len(buffer) if final else max(len(buffer) - 2, position)
+                    break
+                position = end + 3
+                self.in_comment = False
+            elif self.skip_tag is not None:
+                closing = CLOSING_REGEXES[self.skip_tag].search(buffer, position)
+                if closing is None:
+                    position = len(buffer) if final else max(len(buffer) - len(self.skip_tag) - 1, position)
+                    break
+                position = closing.start()
+                self.skip_tag = None
+            else:
+                start = buffer.find('<', position)
+                if start < 0:
+                    # last word or entity may continue in the next chunk
+                    end = len(buffer) if final else TRAILING_REGEX.search(buffer, position).start()
+                    self.add_text(buffer[position:end])
+                    position = end
+                    break
+                self.add_text(buffer[position:start])
+                position = start
+                if len(buffer) - start < 4 and not final:
+                    break
+                if buffer.startswith('<!--', start):
+                    self.in_comment = True
+                    position = start + 4
+                    continue
+                if not TAG_START_REGEX.match(buffer, start):
+                    position = start + 1
+                    continue
+                match = TAG_REGEX.match(buffer, start)
+                if match is None:
+                    if final:
+                        position = len(buffer)
+                    break
+                tag = match.group()
+                position = match.end()
+                name = TAG_NAME_REGEX.match(tag)
+                if name is None:
+                    if tag[:7].lower() == '</title':
+                        self.in_title = False
+                    continue
+                name = name.group(1).lower()
+                if name in SKIPPED_TAGS and not tag.endswith('/>'):
+                    self.skip_tag = name
+                elif name == 'title':
+                    self.in_title = True
+        self.buffer = buffer[position:]
+
+
+def _common_prefix(first, second):
+    size = min(len(first), len(second))
+    i = 0
+    while i < size and first[i] == second[i]:
+        i += 1
+    return i
+
+
+def decode_terms(data, offset=0, end=None):
+    """Yield (term, [(page id, positions)]) of terms between offsets, offset must start a block."""
+    end = len(data) if end is None else end
+    previous = b''
+    while offset < end:
+        shared, offset = decode_varint(data, offset)
+        length, offset = decode_varint(data, offset)
+        word = previous[:shared] + bytes(data[offset:offset + length])
+        offset += length
+        pages, offset = decode_varint(data, offset)
+        postings = []
+        page_id = 0
+        for _ in range(pages):
+            delta, offset = decode_varint(data, offset)
+            page_id += delta
+            count, offset = decode_varint(data, offset)
+            positions = []
+            position = 0
+            for _ in range(count):
+                delta, offset = decode_varint(data, offset)
+                position += delta
+                positions.append(position)
+            postings.append((page_id, positions))
+        previous = word
+        yield word.decode('utf-8'), postings
+
+
+class SearchIndex(object):
+    """Words of every page, pages maps url to (title, {term: positions})."""
+
+    def __init__(self, pages=None):
+        self.pages = dict(pages or {})
+
+    @staticmethod
+    def paths(directory):
+        return (os.path.join(directory, INDEX_NAME + '.json'), os.path.join(directory, INDEX_NAME + '.bin'))
+
+    @classmethod
+    def load(cls, directory):
+        """Decode saved index back into pages, unusable index gives an empty one."""
+        header = read_header(directory)
+        if header is None:
+            return cls()
+        try:
+            with open(cls.paths(directory)[1], 'rb') as file:
+                data = file.read()
+        except OSError:
+            return cls()
+        if len(data) != header['size']:
+            return cls()
+        pages = [(url, (title, {})) for url, title in header['pages']]
+        for term, postings in decode_terms(data):
+            for page_id, positions in postings:
+                pages[page_id][1][1][term] = positions
+        return cls(pages)
+
+    def encode(self):
+        """Return (header, postings bytes)."""
+        urls = sorted(self.pages)
+        postings = {}
+        for page_id, url in enumerate(urls):
+            for term, positions in self.pages[url][1].items():
+                postings.setdefault(term, []).append((page_id, positions))
+        data = bytearray()
+        blocks = []
+        previous = b''
+        for number, term in enumerate(sorted(postings)):
+            word = term.encode('utf-8')
+            if number % BLOCK_SIZE == 0:
+                blocks.append([term, len(data)])
+                previous = b''
+            shared = _common_prefix(previous, word)
+            encode_varint(shared, data)
+            encode_varint(len(word) - shared, data)
+            data += word[shared:]
+            encode_varint(len(postings[term]), data)
+            last_id = 0
+            for page_id, positions in postings[term]:
+                encode_varint(page_id - last_id, data)
+                last_id = page_id
+                encode_varint(len(positions), data)
+                last = 0
+                for position in positions:
+                    encode_varint(position - last, data)
+                    last = position
+            previous = word
+        header = {
+            'version': INDEX_VERSION,
+            'pages': [[url, self.pages[url][0]] for url in urls],
+            'terms': len(postings),
+            'blocks': blocks,
+            'size': len(data)
+        }
+        return header, bytes(data)
+
+    def save(self, directory):
+        """Postings are replaced first, header which refers to them last."""
+        header, data = self.encode()
+        header_path, data_path = self.paths(directory)
+        _replace(data_path, data)
+        _replace(header_path, json.dumps(header, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+
+def _replace(path, data):
+    """Write data into temporary file and move it over path."""
+    tmp_path = os.path.join(os.path.dirname(path), '.' + os.path.basename(path) + '.tmp')
+    with open(tmp_path, 'wb') as file:
+        file.write(data)
+    os.replace(tmp_path, path)
+
+
+def read_header(directory):
+    try:
+        with open(SearchIndex.paths(directory)[0], 'r', encoding='utf-8') as file:
+            header = json.load(file)
+    except (IOError, ValueError):
+        return None
+    return header if header.get('version') == INDEX_VERSION else None
+
+
+def update_index(directory, pages):
+    """
+    Replace entries of rebuilt pages {url: (title, terms)} in saved index.
+
+    Pages whose output is gone are dropped, index is rewritten only if it changed.
+    """
+    index = SearchIndex.load(directory)
+    removed = [x for x in index.pages if x not in pages and not os.path.exists(os.path.join(directory, x))]
+    changed = removed or any(index.pages.get(url) != page for url, page in pages.items())
+    for url in removed:
+        del index.pages[url]
+    index.pages.update(pages)
+    if changed or read_header(directory) is None:
+        index.save(directory)
+    return index
+
+
+def remove_index(directory):
+    for path in SearchIndex.paths(directory):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def lookup(directory, term):
+    """{url: positions} of term, only the block which can contain it is read."""
+    header = read_header(directory)
+    term = term.lower()
+    if header is None or not header['blocks']:
+        return {}
+    number = bisect.bisect_right([x[0] for x in header['blocks']], term) - 1
+    if number < 0:
+        return {}
+    start = header['blocks'][number][1]
+    end = header['blocks'][number + 1][1] if number + 1 < len(header['blocks']) else header['size']
+    with open(SearchIndex.paths(directory)[1], 'rb') as file:
+        file.seek(start)
+        data = file.read(end - start)
+    for word, postings in decode_terms(data):
+        if word == term:
+            return {header['pages'][page_id][0]: positions for page_id, positions in postings}
+        if word > term:
+            break
+    return {}
+
+
+def search(directory, query):
+    """Urls of pages which contain every word of query, most matches first."""
+    results = None
+    for word in WORD_REGEX.findall(query):
+        found = lookup(directory, word)
+        if results is None:
+            results = {url: len(x) for url, x in found.items()}
+        else:
+            results = {url: count + len(found[url]) for url, count in results.items() if url in found}
+    return sorted(results or {}, key=lambda x: (-results[x], x))
@@ -0,0 +1,182 @@
+import os
+import sys
+import threading
+import urllib.parse
+import posixpath
+import io
+import mimetypes
+import email.utils
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+from template_engine.disk_cache import DEFAULT_MAX_SIZE
+from assets import ASSET_DIRS
+from memory_site import InMemorySite
+from compress import is_compressible, is_up_to_date
+from generator import build_files, check_watchable, page_patterns, watching
+
+
+def serve_files(root='.', dest='site', watch=False, port=8000, force=False, jobs=1, backend='tree',
+                in_memory=False, gzip_level=None, link_assets=False, fingerprint=False, profile=False,
+                profile_trace=None, snapshots=None, ignore=(), minify=False, disk_cache=True,
+                cache_size=DEFAULT_MAX_SIZE, search=False):
+    """
+    Simple and all used example of HttpServer.
+
+    If you saw one, you will understand and this.
+    With in_memory pages are rendered on request and nothing is written to disk,
+    only asset directories (ASSET_DIRS) of source folder are served as files.
+    Precompressed .gz files are sent to clients which accept gzip.
+    profile, profile_trace, snapshots, minify, disk_cache, cache_size and search are used for the initial build,
+    see build_files.
+    """
+    if watch and not in_memory:
+        check_watchable(root, dest, snapshots)
+    site = InMemorySite(root, dest, backend=backend, patterns=page_patterns(dest, ignore)) if in_memory else None
+    serve_dir = os.path.abspath(root) if in_memory else os.path.join(os.getcwd(), dest)
+
+    class RequestHandler(SimpleHTTPRequestHandler):
+        """Keep-alive handler with ETag/Last-Modified validation and without request logging."""
+
+        protocol_version = 'HTTP/1.1'
+        timeout = 30
+        etag = None
+        vary = False
+
+        def translate_path(self, path):
+
+            root = serve_dir
+            path = path.split('?', 1)[0]
+            path = path.split('#', 1)[0]
+            path = posixpath.normpath(urllib.parse.unquote(path))
+            words = path.split('/')
+            words = [_f for _f in words if _f]
+            path = root
+            for word in words:
+                drive, word = os.path.splitdrive(word)
+                head, word = os.path.split(word)
+                if word in (os.curdir, os.pardir):
+                    continue
+                path = os.path.join(path, word)
+            return path
+
+        def send_head(self):
+            self.etag = None
+            self.vary = False
+            if site is not None and site.page_name(self.path):
+                return self.send_page(site.page_name(self.path))
+            if site is not None and not self.is_asset():
+                self.send_error(404, 'File not found')
+                return None
+            path = self.translate_path(self.path)
+            if os.path.isdir(path):
+                path = os.path.join(path, 'index.html')
+            try:
+                st = os.stat(path)
+            except OSError:
+                return super().send_head()
+            self.etag = '"{0:x}-{1:x}"'.format(st.st_mtime_ns, st.st_size)
+            # both variants of compressible file depend on Accept-Encoding for shared caches
+            self.vary = is_compressible(path)
+            compressed = self.vary and self.accepts_gzip() and is_up_to_date(path, path + '.gz')
+            if compressed:
+                self.etag = self.etag[:-1] + '-gz"'
+            if self.etag in self.headers.get('If-None-Match', ''):
+                self.send_response(304)
+                self.send_header('Last-Modified', email.utils.formatdate(st.st_mtime, usegmt=True))
+                self.end_headers()
+                return None
+            if compressed:
+                return self.send_compressed(path, st)
+            return super().send_head()
+
+        def is_asset(self):
+            """Check that path is inside one of asset directories of source folder."""
+            relpath = os.path.relpath(self.translate_path(self.path), serve_dir)
+            return relpath.split(os.sep)[0] in ASSET_DIRS
+
+        def accepts_gzip(self):
+            encodings = self.headers.get('Accept-Encoding', '')
+            return any(x.split(';')[0].strip() == 'gzip' for x in encodings.split(','))
+
+        def send_compressed(self, path, st):
+            """Send precompressed sibling of file."""
+            try:
+                f = open(path + '.gz', 'rb')
+            except OSError:
+                return super().send_head()
+            self.send_response(200)
+            self.send_header('Content-Type', mimetypes.guess_type(path)[0] or 'application/octet-stream')
+            self.send_header('Content-Encoding', 'gzip')
+            self.send_header('Content-Length', str(os.fstat(f.fileno()).st_size))
+            self.send_header('Last-Modified', email.utils.formatdate(st.st_mtime, usegmt=True))
+            self.end_headers()
+            return f
+
+        def send_page(self, filename):
+            """Send page rendered in memory."""
+            try:
+                page = site.get(filename)
+            except Exception as e:
+                self.send_error(500, 'Error while building {0}'.format(filename), str(e))
+                return None
+            if page is None:
+                self.send_error(404, 'File not found')
+                return None
+            content, self.etag = page
+            if self.etag in self.headers.get('If-None-Match', ''):
+                self.send_response(304)
+                self.end_headers()
+                return None
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            return io.BytesIO(content)
+
+        def end_headers(self):
+            if self.etag is not None:
+                self.send_header('ETag', self.etag)
+                self.etag = None
+            if self.vary:
+                self.send_header('Vary', 'Accept-Encoding')
+                self.vary = False
+            super().end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    class SimpleHTTPServer(ThreadingHTTPServer):
+        """Serve every connection in its own thread, one failed request does not stop server."""
+
+        daemon_threads = True
+
+        def handle_error(self, request, client_address):
+            if not isinstance(sys.exc_info()[1], ConnectionError):
+                super().handle_error(request, client_address)
+
+    server_address = ('', port)
+    httpd = SimpleHTTPServer(server_address, RequestHandler)
+    server_thread = threading.Thread(target=httpd.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+
+    print("HTTP server started on port {0}".format(server_address[1]))
+
+    if not in_memory:
+        build_files(root=root, dest=dest, force=True, jobs=jobs, backend=backend, gzip_level=gzip_level,
+                    link_assets=link_assets, fingerprint=fingerprint, profile=profile,
+                    profile_trace=profile_trace, snapshots=snapshots, ignore=ignore, minify=minify,
+                    disk_cache=disk_cache, cache_size=cache_size, search=search)
+
+    try:
+        if watch:
+            watching(root, dest, jobs=jobs, backend=backend,
+                     on_change=site.invalidate if in_memory else None, gzip_level=gzip_level,
+                     link_assets=link_assets, fingerprint=fingerprint, ignore=ignore)
+        else:
+            server_thread.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
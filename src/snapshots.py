@@ -0,0 +1,98 @@
+import os
+import time
+import shutil
+
+SNAPSHOTS_SUFFIX = '.snapshots'
+
+
+def snapshots_dir(root, dest):
+    """Folder with versions of output folder, placed next to it."""
+    return os.path.join(root, os.path.normpath(dest) + SNAPSHOTS_SUFFIX)
+
+
+def list_snapshots(root, dest):
+    """Names of snapshots from oldest to newest."""
+    try:
+        return sorted(x for x in os.listdir(snapshots_dir(root, dest)) if not x.startswith('.'))
+    except OSError:
+        return []
+
+
+def current_snapshot(root, dest):
+    """Name of snapshot published as dest, None if dest is not a snapshot."""
+    path = os.path.join(root, dest)
+    if not os.path.islink(path):
+        return None
+    target = os.path.realpath(path)
+    if os.path.dirname(target) != os.path.realpath(snapshots_dir(root, dest)):
+        return None
+    return os.path.basename(target)
+
+
+def link_tree(source, target):
+    """Recreate source tree in target with hardlinks, copying files which can not be linked."""
+    os.makedirs(target)
+    with os.scandir(source) as entries:
+        for entry in entries:
+            path = os.path.join(target, entry.name)
+            if entry.is_dir(follow_symlinks=False):
+                link_tree(entry.path, path)
+            elif entry.name[-4:] != '.tmp':
+                try:
+                    os.link(entry.path, path, follow_symlinks=False)
+                except OSError:
+                    shutil.copy2(entry.path, path, follow_symlinks=False)
+
+
+def snapshot_name(timestamp):
+    """Sortable name of snapshot made at timestamp."""
+    return time.strftime('%Y%m%d-%H%M%S', time.localtime(timestamp)) + '-{0:06d}'.format(int(timestamp * 1e6) % 1000000)
+
+
+def create_snapshot(root, dest):
+    """
+    Make new snapshot as a hardlinked copy of current output and return its path relative to root.
+
+    Outputs are always replaced by new files, never rewritten in place,
+    so changes of new snapshot do not leak into previous ones.
+    """
+    path = os.path.join(snapshots_dir(root, dest), snapshot_name(time.time()))
+    previous = os.path.join(root, dest)
+    if os.path.isdir(previous):
+        link_tree(previous, path)
+    else:
+        os.makedirs(path)
+    return os.path.relpath(path, root)
+
+
+def publish_snapshot(root, dest, snapshot):
+    """
+    Atomically point dest to snapshot.
+
+    Output folder which is not a snapshot yet is moved into snapshots first.
+    """
+    path = os.path.join(root, dest)
+    target = os.path.relpath(os.path.join(root, snapshot), os.path.dirname(os.path.abspath(path)))
+    if os.path.isdir(path) and not os.path.islink(path):
+        os.rename(path, os.path.join(snapshots_dir(root, dest), snapshot_name(os.stat(path).st_mtime)))
+    tmp_link = path + '.tmp-link'
+    if os.path.lexists(tmp_link):
+        os.remove(tmp_link)
+    os.symlink(target, tmp_link)
+    os.replace(tmp_link, path)
+
+
+def prune_snapshots(root, dest, keep):
+    """Remove oldest snapshots so that only keep newest ones remain, published one is never removed."""
+    current = current_snapshot(root, dest)
+    names = list_snapshots(root, dest)
+    removed = []
+    for name in names[:max(len(names) - keep, 0)]:
+        if name != current:
+            shutil.rmtree(os.path.join(snapshots_dir(root, dest), name), ignore_errors=True)
+            removed.append(name)
+    return removed
+
+
+def discard_snapshot(root, snapshot):
+    shutil.rmtree(os.path.join(root, snapshot), ignore_errors=True)
@@ -2,57 +2,22 @@
 import re
 import operator
 import ast
+from template_engine.cache import template_cache
+from template_engine.loader import default_loader
+from template_engine.lexer import tokenize, TEXT, INCLUDE, EXTENDS, BLOCK_START, BLOCK_END
+from template_engine.lexer import VARIABLE, OPEN_TAG, CLOSE_TAG
 from template_engine.exceptions import TemplateError
 from template_engine.exceptions import TemplateContextError, TemplateSyntaxError
 from template_engine.exceptions import TemplateInheritanceError, TemplateLoopInheritanceError
 
 
-def flatten(input_list):
-    output_list = []
-    for element in input_list:
-        if type(element) == list:
-            output_list.extend(flatten(element))
-        else:
-            output_list.append(element)
-    return output_list
-
-
-PAGE_TOKEN_START = '{!'
-PAGE_TOKEN_END = '!}'
-PAGE_REGEX = re.compile(r"(%s.*?%s)" % (
-    PAGE_TOKEN_START,
-    PAGE_TOKEN_END
-))
-
-PAGE_BLOCK_START = '{?'
-PAGE_BLOCK_END = '?}'
-PAGE_BLOCKS_REGEX = re.compile(r"({\?.*?\?})")
-
-INCLUDE_TAG_START = '{#'
-INCLUDE_TAG_END = '#}'
-INCLUDE_TAGS_REGEX = re.compile(r"(%s.*?%s)" % (
-    INCLUDE_TAG_START,
-    INCLUDE_TAG_END
-))
-
-VARIABLE_TOKEN_START = '{{'
-VARIABLE_TOKEN_END = '}}'
-BLOCK_TOKEN_START = '{%'
-BLOCK_TOKEN_END = '%}'
-TOKEN_REGEX = re.compile(r"(%s.*?%s|%s.*?%s)" % (
-    VARIABLE_TOKEN_START,
-    VARIABLE_TOKEN_END,
-    BLOCK_TOKEN_START,
-    BLOCK_TOKEN_END
-))
-
-VARIABLE_FRAGMENT = 0
-OPEN_BLOCK_FRAGMENT = 1
-CLOSE_BLOCK_FRAGMENT = 2
-TEXT_FRAGMENT = 3
-
 WHITESPACE = re.compile('\s+')
 
+SCOPE_TAGS = ('array', 'if')
+
+# kind of compiler item which holds nodes compiled before
+NODES = -1
+
 OPERATOR_TABLE = {
     '<': operator.lt,
     '>': operator.gt,
@@ -71,45 +36,45 @@ def eval_expression(expr):
         return 'name', expr
 
 
+def split_name(name):
+    """Split dotted name into flag of lookup in outer scope and tuple of tokens."""
+    if name.startswith('..'):
+        return True, tuple(name[2:].split('.'))
+    return False, tuple(name.split('.'))
+
+
+def is_balanced(tokens):
+    """Check that every scope opened in tokens is closed in them too."""
+    depth = 0
+    for token in tokens:
+        if token.kind == OPEN_TAG and (token.clean.split() or [''])[0] in SCOPE_TAGS:
+            depth += 1
+        elif token.kind == CLOSE_TAG:
+            depth -= 1
+            if depth < 0:
+                return False
+    return depth == 0
+
+
 def resolve(name, context):
     """Resolve syntax substintion."""
-    if name.startswith('..'):
+    outer, tokens = split_name(name)
+    return resolve_tokens(outer, tokens, context, name)
+
+
+def resolve_tokens(outer, tokens, context, name):
+    """Resolve already splitted name."""
+    if outer:
         context = context.get('..', {})
-        name = name[2:]
     try:
-        for tok in name.split('.'):
+        for tok in tokens:
             if tok in context.keys():
                 context = context[tok]
             else:
                 context = ''
         return context
     except KeyError:
-        raise TemplateContextError(name)
-
-
-class Fragment:
-    """Fragment of template which used for definition of tokens."""
-
-    def __init__(self, raw_text):
-        self.raw = raw_text
-        self.clean = self.clean_fragment()
-
-    def clean_fragment(self):
-        """Delete trash from fragment."""
-        if self.raw[:2] in (VARIABLE_TOKEN_START, BLOCK_TOKEN_START):
-            return self.raw[2:-2].strip()
-        return self.raw
-
-    @property
-    def type(self):
-        """Determine the type of the fragment."""
-        raw_start = self.raw[:2]
-        if raw_start == VARIABLE_TOKEN_START:
-            return VARIABLE_FRAGMENT
-        elif raw_start == BLOCK_TOKEN_START:
-            return CLOSE_BLOCK_FRAGMENT if self.clean[:3] == 'end' else OPEN_BLOCK_FRAGMENT
-        else:
-            return TEXT_FRAGMENT
+        raise TemplateContextError(name[2:] if outer else name)
 
 
 class Node:
@@ -130,6 +95,12 @@ class Node:
     def render(self, context):
         pass
 
+    def iter_render(self, context):
+        """Render node by chunks, by default all node is one chunk."""
+        html = self.render(context)
+        if html:
+            yield str(html)
+
     def exit_scope(self):
         pass
 
@@ -143,14 +114,30 @@ class Node:
             return '' if not child_html else str(child_html)
         return ''.join(map(render_child, children))
 
+    def iter_render_children(self, context, children=None):
+        if children is None:
+            children = self.children
+        for child in children:
+            yield from child.iter_render(context)
+
 
 class Root(Node):
     """Root of tree."""
 
+    def __getstate__(self):
+        """Generated render functions are not pickled, they are made again when needed."""
+        state = dict(self.__dict__)
+        state.pop('render_function', None)
+        state.pop('iter_render_function', None)
+        return state
+
     def render(self, context):
         """Start render of elements."""
         return self.render_children(context)
 
+    def iter_render(self, context):
+        return self.iter_render_children(context)
+
 
 class Variable(Node):
     """Python-like variables."""
@@ -175,11 +162,16 @@ class Array(Node):
             raise TemplateSyntaxError(fragment)
 
     def render(self, context):
-        items = self.item[1] if self.item[0] == 'literal' else resolve(self.item[1], context)
-
         def render_item(item):
             return self.render_children({'..': context, 'item': item})
-        return ''.join(map(render_item, items))
+        return ''.join(map(render_item, self.items(context)))
+
+    def iter_render(self, context):
+        for item in self.items(context):
+            yield from self.iter_render_children({'..': context, 'item': item})
+
+    def items(self, context):
+        return self.item[1] if self.item[0] == 'literal' else resolve(self.item[1], context)
 
 
 class If(Node):
@@ -197,6 +189,12 @@ class If(Node):
             self.rhs = eval_expression(bits[2])
 
     def render(self, context):
+        return self.render_children(context, self.choose_branch(context))
+
+    def iter_render(self, context):
+        return self.iter_render_children(context, self.choose_branch(context))
+
+    def choose_branch(self, context):
         lhs = self.resolve_side(self.lhs, context)
         if hasattr(self, 'op'):
             op = OPERATOR_TABLE.get(self.op)
@@ -206,8 +204,7 @@ class If(Node):
             exec_if_branch = op(lhs, rhs)
         else:
             exec_if_branch = operator.truth(lhs)
-        if_branch, else_branch = self.split_children()
-        return self.render_children(context, self.if_branch if exec_if_branch else self.else_branch)
+        return self.if_branch if exec_if_branch else self.else_branch
 
     def resolve_side(self, side, context):
         return side[1] if side[0] == 'literal' else resolve(side[1], context)
@@ -242,30 +239,73 @@ class Text(Node):
     def render(self, context):
         return self.text
 
+    def iter_render(self, context):
+        if self.text:
+            yield self.text
+
 
 class Compiler:
-    """Find, process and compile all instructions in template."""
+    """Find, process and compile all instructions in template.
 
-    def __init__(self, template_string):
-        self.template_string = template_string
+    Template is given as a string or as tokens already produced by lexer.
+    Includes, inheritance and block tags left in tokens are plain text here.
+    runs splits tokens into (tokens, shared) pieces, shared pieces whose scopes are
+    closed in them are compiled once per content through cache and their nodes are reused.
+    """
 
-    def each_fragment(self):
-        for fragment in TOKEN_REGEX.split(self.template_string):
-            if fragment:
-                yield Fragment(fragment)
+    def __init__(self, template_string, tokens=None, runs=None, cache=None):
+        self.template_string = template_string
+        self.tokens = tokens
+        self.runs = runs
+        self.cache = cache
+
+    def each_item(self):
+        """Fragments to compile and lists of already compiled nodes."""
+        if self.runs is None:
+            yield from self.each_fragment()
+            return
+        for tokens, shared in self.runs:
+            if shared and self.cache is not None and is_balanced(tokens):
+                yield NODES, self.compile_shared(tokens).children
+            else:
+                yield from self.each_fragment(tokens)
+
+    def compile_shared(self, tokens):
+        def compile_tokens(contents):
+            return Compiler(contents, tokens).compile()
+        return self.cache.get(''.join(token.raw for token in tokens), compile_tokens)
+
+    def each_fragment(self, tokens=None):
+        """Tokens with adjacent text merged together."""
+        if tokens is None:
+            tokens = tokenize(self.template_string) if self.tokens is None else self.tokens
+        text = []
+        for token in tokens:
+            if token.kind in (VARIABLE, OPEN_TAG, CLOSE_TAG):
+                if text:
+                    yield TEXT, ''.join(text)
+                    text = []
+                yield token.kind, token.clean
+            else:
+                text.append(token.raw)
+        if text:
+            yield TEXT, ''.join(text)
 
     def compile(self):
         root = Root()
         scope_stack = [root]
-        for fragment in self.each_fragment():
+        for kind, fragment in self.each_item():
             if not scope_stack:
                 raise TemplateError('nesting issues')
             parent_scope = scope_stack[-1]
-            if fragment.type == CLOSE_BLOCK_FRAGMENT:
+            if kind == NODES:
+                parent_scope.children.extend(fragment)
+                continue
+            if kind == CLOSE_TAG:
                 parent_scope.exit_scope()
                 scope_stack.pop()
                 continue
-            new_node = self.create_node(fragment)
+            new_node = self.create_node(kind, fragment)
             if new_node:
                 parent_scope.children.append(new_node)
                 if new_node.creates_scope:
@@ -273,14 +313,14 @@ class Compiler:
                     new_node.enter_scope()
         return root
 
-    def create_node(self, fragment):
+    def create_node(self, kind, fragment):
         node_class = None
-        if fragment.type == TEXT_FRAGMENT:
+        if kind == TEXT:
             node_class = Text
-        elif fragment.type == VARIABLE_FRAGMENT:
+        elif kind == VARIABLE:
             node_class = Variable
-        elif fragment.type == OPEN_BLOCK_FRAGMENT:
-            cmd = fragment.clean.split()[0]
+        elif kind == OPEN_TAG:
+            cmd = fragment.split()[0]
             if cmd == 'array':
                 node_class = Array
             elif cmd == 'if':
@@ -289,114 +329,190 @@ class Compiler:
                 node_class = Else
         if node_class is None:
             raise TemplateSyntaxError(fragment)
-        return node_class(fragment.clean)
+        return node_class(fragment)
 
 
 class Template:
+    """Compiled template, rendered by walking the tree or by generated Python code.
+
+    backend is 'tree' or 'codegen', both produce the same output.
+    Generated functions are compiled on first use of render or iter_render,
+    so a page which is only streamed never pays for the other one.
+    """
 
-    def __init__(self, contents):
+    def __init__(self, contents, cache=template_cache, backend='tree', tokens=None, root=None):
         self.contents = contents
-        self.root = Compiler(contents).compile()
+
+        def compile_contents(contents):
+            return Compiler(contents, tokens).compile()
+        if root is not None:
+            self.root = root
+        elif cache is None:
+            self.root = compile_contents(contents)
+        else:
+            self.root = cache.get(contents, compile_contents)
+        if backend not in ('tree', 'codegen'):
+            raise ValueError('Unknown template backend {0}'.format(backend))
+        self.backend = backend
 
     def render(self, **kwargs):
+        if self.backend == 'codegen':
+            from template_engine.codegen import compile_render_function
+            return compile_render_function(self.root)(kwargs)
         return self.root.render(kwargs)
 
+    def iter_render(self, **kwargs):
+        """Render template lazily, chunk by chunk."""
+        if self.backend == 'codegen':
+            from template_engine.codegen import compile_render_function
+            return compile_render_function(self.root, streaming=True)(kwargs)
+        return self.root.iter_render(kwargs)
+
+    def render_to(self, stream, **kwargs):
+        """Write rendered template into stream without building whole page in memory."""
+        write = stream.write
+        for chunk in self.iter_render(**kwargs):
+            write(chunk)
+
 
 class Collector:
-    """Collect all nested templates, then transmit them to Template."""
+    """Collect all nested templates, then transmit them to Template.
 
-    def __init__(self, absolute_path, pagename):
+    With disk_cache (DiskCache) resolved and compiled page is reused from previous runs.
+    Included and parent templates are compiled once per content through template_cache,
+    pages reuse their nodes.
+    """
+
+    def __init__(self, absolute_path, pagename, loader=None, backend='tree', disk_cache=None):
         self.path = absolute_path
         self.pagename = pagename
+        self.loader = default_loader if loader is None else loader
+        self.backend = backend
+        self.disk_cache = disk_cache
         self.collected_page = [pagename]
-        with open(self.path + self.pagename, 'r') as file:
-            self.file = str(file.read())
+        self.dependencies = [pagename.lstrip('/')]
+        self.file = self.loader.load(self.path + self.pagename)
+        self._tokens = None
+
+    @property
+    def tokens(self):
+        """Tokens of page, the page is scanned only when they are needed."""
+        if self._tokens is None:
+            self._tokens = tokenize(self.file)
+        return self._tokens
+
+    @tokens.setter
+    def tokens(self, tokens):
+        self._tokens = tokens
 
     def __str__(self):
         return self.file
 
     def assemble_page(self, **kwargs):
-        self.prepare_page()
-        self.file = self.prepare_include_tags()
-        rendered = Template(str(self.file)).render(**kwargs)
+        rendered = self.prepare_template().render(**kwargs)
         return rendered
 
-    def prepare_include_tags(self, text=None):
-        if text:
-            include_tags = [x for x in INCLUDE_TAGS_REGEX.split(text) if x]
-        else:
-            include_tags = [x for x in INCLUDE_TAGS_REGEX.split(self.file) if x]
-        if len(include_tags) == 1 and text is None:
-            return ''.join(flatten(include_tags))
-        elif len(include_tags) == 1:
-            return include_tags
-        tags = []
-        for i in range(len(include_tags)):
-            if include_tags[i][:2] == "{#" and include_tags[i][-2:] == "#}":
-                cur = include_tags[i][2:-2].strip()
-                tags.append([cur, i])
-        for i in range(len(tags)):
-            text = self.find_parent_data(tags[i][0])
-            res = self.prepare_include_tags(text)
-            include_tags[tags[i][1]] = res
-        return ''.join(flatten(include_tags))
-
-    def prepare_page(self, previous_blocks=None):
-        if previous_blocks is not None:
-            self.file = self.find_blocks_for_substition(previous_blocks)
-        components = [x.strip() for x in PAGE_REGEX.split(str(self.file)) if x]
-        if len(components) == 1:
-            return
-        elif len(components) == 2:
-            parent_address = components[0][2:-2].strip().strip('"').strip("'")
-            if parent_address not in self.collected_page:
-                self.collected_page.append(parent_address)
-            else:
+    def assemble_page_to(self, stream, **kwargs):
+        """Assemble page and write it into stream chunk by chunk."""
+        self.prepare_template().render_to(stream, **kwargs)
+
+    def prepare_template(self):
+        if self.disk_cache is not None:
+            cached = self.disk_cache.get(self.path, self.pagename)
+            if cached is not None:
+                self.dependencies, self.file, root = cached
+                return Template(self.file, backend=self.backend, root=root)
+        runs = self.prepare_include_tags(self.prepare_page())
+        self.tokens = [token for source, tokens in runs for token in tokens]
+        self.file = ''.join(token.raw for token in self.tokens)
+        # templates other than page are shared
+        runs = [(tokens, source is not None) for source, tokens in runs]
+        root = Compiler(self.file, self.tokens, runs=runs, cache=template_cache).compile()
+        template = Template(self.file, backend=self.backend, root=root)
+        if self.disk_cache is not None:
+            self.disk_cache.set(self.path, self.pagename, self.dependencies, self.file, template.root)
+        return template
+
+    def prepare_include_tags(self, tokens, output=None, including=()):
+        """Splice (source, token) pairs of included templates into (source, tokens) runs read from one file."""
+        if output is None:
+            output = []
+        for source, token in tokens:
+            if token.kind != INCLUDE:
+                if output and output[-1][0] == source:
+                    output[-1][1].append(token)
+                else:
+                    output.append((source, [token]))
+                continue
+            if token.clean in including:
                 raise TemplateLoopInheritanceError
-            blocks = self.find_blocks(components[1])
-            self.file = self.find_parent_data(parent_address)
-            self.prepare_page(blocks)
-        else:
-            raise TemplateInheritanceError
+            self.prepare_include_tags(self.template_tokens(token.clean), output, including + (token.clean,))
+        return output
 
-    def find_blocks(self, raw_blocks):
-        blocks = [x for x in PAGE_BLOCKS_REGEX.split(raw_blocks) if x]
-        stack = []
-        dic = {}
-        for i in range(len(blocks)):
-            if blocks[i][:2] == '{?' and 'endblock' not in blocks[i]:
-                cur = blocks[i][2:-2].strip()
-                stack.append([cur, i])
-            elif blocks[i][:2] == '{?' and 'endblock' in blocks[i]:
-                if len(stack) == 0:
-                    raise TemplateSyntaxError
-                start = stack.pop()
-                dic[start[0]] = [blocks[x] for x in range(start[1] + 1, i)]
-        return dic
+    def prepare_page(self, tokens=None, previous_blocks=None):
+        """Substitute blocks into parent templates, return (source, token) pairs, source of page tokens is None."""
+        if tokens is None:
+            tokens = [(None, token) for token in self.tokens]
+        if previous_blocks is not None:
+            tokens = self.find_blocks_for_substition(tokens, previous_blocks)
+        extends = [i for i, (source, token) in enumerate(tokens) if token.kind == EXTENDS]
+        if not extends:
+            return tokens
+        start = extends[0]
+        if len(extends) > 1 or any(x.kind != TEXT or x.raw.strip() for source, x in tokens[:start]):
+            raise TemplateInheritanceError
+        parent_address = tokens[start][1].clean
+        if parent_address not in self.collected_page:
+            self.collected_page.append(parent_address)
+        else:
+            raise TemplateLoopInheritanceError
+        blocks = self.find_blocks(tokens[start + 1:])
+        return self.prepare_page(self.template_tokens(parent_address), blocks)
 
-    def find_blocks_for_substition(self, subs):
-        components = [x for x in PAGE_BLOCKS_REGEX.split(str(self.file)) if x]
+    def block_ranges(self, tokens):
+        """Dict of block name -> (index of start tag, index of end tag), inner blocks first."""
         stack = []
-        dic = {}
-        for i in range(len(components)):
-            if components[i][:2] == '{?' and 'endblock' not in components[i]:
-                cur = components[i][2:-2].strip()
-                stack.append([cur, i])
-            elif components[i][:2] == '{?' and 'endblock' in components[i]:
+        ranges = {}
+        for i, (source, token) in enumerate(tokens):
+            if token.kind == BLOCK_START:
+                stack.append((token.clean, i))
+            elif token.kind == BLOCK_END:
                 if len(stack) == 0:
                     raise TemplateSyntaxError
-                start = stack.pop()
-                dic[start[0]] = list(range(start[1], i + 1))
-        for i in dic.keys():
-            if i in subs.keys():
-                for j in dic[i]:
-                    components[j] = ''
-                components[dic[i][0]] = "".join(subs[i])
-        return "".join(components)
+                name, start = stack.pop()
+                ranges[name] = (start, i)
+        return ranges
+
+    def find_blocks(self, tokens):
+        return {name: tokens[start + 1:end] for name, (start, end) in self.block_ranges(tokens).items()}
+
+    def find_blocks_for_substition(self, tokens, subs):
+        """Replace blocks of parent by blocks of child, block of outer block wins."""
+        skipped = bytearray(len(tokens))
+        inserts = {}
+        for name, (start, end) in self.block_ranges(tokens).items():
+            if name in subs:
+                for i in range(start, end + 1):
+                    skipped[i] = 1
+                    inserts.pop(i, None)
+                inserts[start] = subs[name]
+        result = []
+        for i, token in enumerate(tokens):
+            if i in inserts:
+                result.extend(inserts[i])
+            elif not skipped[i]:
+                result.append(token)
+        return result
+
+    def template_tokens(self, name):
+        """(source, token) pairs of included or parent template, its name is the source."""
+        return [(name, token) for token in tokenize(self.find_parent_data(name))]
 
     def find_parent_data(self, parent_name):
-        with open(self.path + '/' + parent_name, 'r') as file:
-            return str(file.read())
+        """Read included or parent template and remember it as dependency of page."""
+        if parent_name not in self.dependencies:
+            self.dependencies.append(parent_name)
+        return self.loader.load(self.path + '/' + parent_name)
 
 
 if __name__ == "__main__":
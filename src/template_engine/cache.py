@@ -0,0 +1,60 @@
+"""Process-wide cache of compiled templates."""
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def content_hash(contents):
+    """Hash of template text, used as a cache key."""
+    return hashlib.sha1(contents.encode('utf-8')).hexdigest()
+
+
+class TemplateCache:
+    """LRU cache of compiled Root trees keyed by the hash of template text."""
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, contents, compile_func):
+        """Return compiled tree for contents, compile it with compile_func on miss."""
+        key = content_hash(contents)
+        with self._lock:
+            root = self._entries.get(key)
+            if root is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return root
+            self.misses += 1
+        root = compile_func(contents)
+        with self._lock:
+            self._entries[key] = root
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return root
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Counters for build summaries."""
+        total = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0
+        }
+
+
+template_cache = TemplateCache()
@@ -0,0 +1,151 @@
+"""Compile tree of template nodes into Python render function."""
+import operator
+from template_engine.base import Variable, Array, If, Else, Text
+from template_engine.base import OPERATOR_TABLE, split_name, resolve_tokens
+from template_engine.exceptions import TemplateSyntaxError
+
+
+class CodeGenerator:
+    """Generate Python source of render function from tree built by Compiler.
+
+    Text is kept in preallocated constants and dotted names are splitted once,
+    so rendering is just a sequence of appends to one list.
+    Output is identical to Root.render.
+    With streaming=True generated function is a generator yielding chunks.
+    """
+
+    def __init__(self, root, streaming=False):
+        self.root = root
+        self.streaming = streaming
+        self.lines = []
+        self.constants = {}
+        self.pending_text = []
+
+    def constant(self, value):
+        name = 'K{0}'.format(len(self.constants))
+        self.constants[name] = value
+        return name
+
+    def emit(self, line, indent):
+        self.lines.append('    ' * indent + line)
+
+    def write(self, expr, indent):
+        if self.streaming:
+            self.emit('yield {0}'.format(expr), indent)
+        else:
+            self.emit('_append({0})'.format(expr), indent)
+
+    def flush_text(self, indent):
+        """Merge adjacent texts into one constant."""
+        text = ''.join(self.pending_text)
+        self.pending_text = []
+        if text:
+            self.write(self.constant(text), indent)
+
+    def generate(self):
+        self.emit('def render(c0):', 0)
+        if not self.streaming:
+            self.emit('_out = []', 1)
+            self.emit('_append = _out.append', 1)
+        self.visit_children(self.root.children, 0, 1)
+        self.flush_text(1)
+        if self.streaming:
+            self.emit('yield from ()', 1)
+        else:
+            self.emit("return ''.join(_out)", 1)
+        return '\n'.join(self.lines) + '\n'
+
+    def visit_children(self, children, scope, indent):
+        for child in children:
+            self.visit(child, scope, indent)
+
+    def visit(self, node, scope, indent):
+        if isinstance(node, Text):
+            if node.text:
+                self.pending_text.append(node.text)
+            return
+        if isinstance(node, Else):
+            return
+        self.flush_text(indent)
+        if isinstance(node, Variable):
+            self.emit('_v = {0}'.format(self.lookup(node.name, scope)), indent)
+            self.emit('if _v:', indent)
+            self.write('_v if _v.__class__ is str else str(_v)', indent + 1)
+        elif isinstance(node, Array):
+            self.visit_array(node, scope, indent)
+        elif isinstance(node, If) and hasattr(node, 'if_branch'):
+            self.visit_if(node, scope, indent)
+        elif self.streaming:
+            self.emit('yield from {0}.iter_render(c{1})'.format(self.constant(node), scope), indent)
+        else:
+            self.emit('_v = {0}.render(c{1})'.format(self.constant(node), scope), indent)
+            self.emit('if _v:', indent)
+            self.write('str(_v)', indent + 1)
+
+    def visit_array(self, node, scope, indent):
+        inner = scope + 1
+        self.emit('for _i{0} in {1}:'.format(inner, self.value(node.item, scope)), indent)
+        self.emit("c{0} = {{'..': c{1}, 'item': _i{0}}}".format(inner, scope), indent + 1)
+        start = len(self.lines)
+        self.visit_children(node.children, inner, indent + 1)
+        self.flush_text(indent + 1)
+        if len(self.lines) == start:
+            self.emit('pass', indent + 1)
+
+    def visit_if(self, node, scope, indent):
+        self.emit('_lhs = {0}'.format(self.value(node.lhs, scope)), indent)
+        if hasattr(node, 'op'):
+            op = OPERATOR_TABLE.get(node.op)
+            if op is None:
+                self.emit('raise TemplateSyntaxError({0})'.format(self.constant(node.op)), indent)
+                return
+            self.emit('_rhs = {0}'.format(self.value(node.rhs, scope)), indent)
+            self.emit('if {0}(_lhs, _rhs):'.format(self.constant(op)), indent)
+        else:
+            self.emit('if _truth(_lhs):', indent)
+        for branch, header in ((node.if_branch, None), (node.else_branch, 'else:')):
+            if header:
+                self.emit(header, indent)
+            start = len(self.lines)
+            self.visit_children(branch, scope, indent + 1)
+            self.flush_text(indent + 1)
+            if len(self.lines) == start:
+                self.emit('pass', indent + 1)
+
+    def value(self, side, scope):
+        """Expression for ('literal', value) or ('name', name) pair."""
+        if side[0] == 'literal':
+            return self.constant(side[1])
+        return self.lookup(side[1], scope)
+
+    def lookup(self, name, scope):
+        outer, tokens = split_name(name)
+        if not outer and len(tokens) == 1:
+            key = self.constant(tokens[0])
+            return "(c{0}[{1}] if {1} in c{0} else '')".format(scope, key)
+        return '_resolve({0}, {1}, c{2}, {3})'.format(
+            outer, self.constant(tokens), scope, self.constant(name))
+
+
+def generate_source(root, streaming=False):
+    """Python source of render function and constants it uses."""
+    generator = CodeGenerator(root, streaming)
+    return generator.generate(), generator.constants
+
+
+def compile_render_function(root, streaming=False):
+    """Build render(context) function for tree, reuse it for the same tree."""
+    attr = 'iter_render_function' if streaming else 'render_function'
+    render = getattr(root, attr, None)
+    if render is not None:
+        return render
+    source, constants = generate_source(root, streaming)
+    namespace = {
+        '_resolve': resolve_tokens,
+        '_truth': operator.truth,
+        'TemplateSyntaxError': TemplateSyntaxError
+    }
+    namespace.update(constants)
+    exec(compile(source, '<template>', 'exec'), namespace)
+    setattr(root, attr, namespace['render'])
+    return namespace['render']
@@ -0,0 +1,236 @@
+"""Persistent cache of resolved and compiled pages, shared between runs."""
+import os
+import sys
+import hmac
+import pickle
+import hashlib
+import functools
+import threading
+
+CACHE_VERSION = 1
+DEFAULT_CACHE_DIR = '.tssg-cache'
+DEFAULT_MAX_SIZE = 64 * 1024 * 1024
+ENTRY_SUFFIX = '.pickle'
+KEY_SIZE = 32
+DIGEST_SIZE = hashlib.sha256().digest_size
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def source_hash(path):
+    """Sha1 of file bytes."""
+    sha = hashlib.sha1()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(65536), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def key_path():
+    """Secret key of user's caches, outside of any source tree."""
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'tssg', 'key')
+
+
+@functools.lru_cache(maxsize=None)
+def user_key(path=None):
+    """Read key, create it if it does not exist yet. Return None if it is unavailable."""
+    path = path or key_path()
+    try:
+        with open(path, 'rb') as file:
+            key = file.read()
+        if len(key) == KEY_SIZE:
+            return key
+    except OSError:
+        pass
+    tmp_path = '{0}.{1}.tmp'.format(path, os.getpid())
+    try:
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as file:
+            file.write(os.urandom(KEY_SIZE))
+        try:
+            # first process which creates key wins, others read it
+            os.link(tmp_path, path)
+        except FileExistsError:
+            pass
+        with open(path, 'rb') as file:
+            key = file.read()
+        return key if len(key) == KEY_SIZE else None
+    except OSError:
+        return None
+    finally:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+class DiskCache:
+    """Resolved source and compiled tree of every page, stored in a directory.
+
+    Entry of a page is valid while content hashes of the page and all templates
+    it includes or extends are the same, (st_mtime_ns, st_size) is checked first
+    so unchanged files are not read, changed mtime of the same content is stored back.
+    Entries made by another CACHE_VERSION or Python version are ignored.
+    Oldest used entries are removed when size exceeds max_size.
+
+    Entries are pickles, so each one is signed by HMAC with key of user (user_key), and
+    entry which was not written by this user, e.g. committed into repository, is never loaded.
+    Without key the cache is not used.
+    """
+
+    def __init__(self, path, max_size=DEFAULT_MAX_SIZE, key=None):
+        self.path = path
+        self.max_size = max_size
+        self.key = key or user_key()
+        self.hits = 0
+        self.misses = 0
+        self.version = (CACHE_VERSION, sys.version_info[:2])
+        self._lock = threading.Lock()
+
+    def entry_path(self, pagename):
+        return os.path.join(self.path, hashlib.sha1(pagename.encode('utf-8')).hexdigest() + ENTRY_SUFFIX)
+
+    def file_states(self, root, dependencies):
+        """{relpath: [mtime_ns, size, sha1]} of dependencies."""
+        states = {}
+        for relpath in dependencies:
+            path = os.path.join(root, relpath)
+            st = os.stat(path)
+            states[relpath] = [st.st_mtime_ns, st.st_size, source_hash(path)]
+        return states
+
+    def is_valid(self, root, states):
+        """
+        Check states of dependencies, mtime of file whose content is the same is updated in states.
+
+        Return (valid, whether states were updated).
+        """
+        updated = False
+        for relpath, state in states.items():
+            mtime_ns, size, sha = state
+            path = os.path.join(root, relpath)
+            try:
+                st = os.stat(path)
+                if st.st_size != size:
+                    return False, updated
+                if st.st_mtime_ns != mtime_ns:
+                    if source_hash(path) != sha:
+                        return False, updated
+                    state[0] = st.st_mtime_ns
+                    updated = True
+            except OSError:
+                return False, updated
+        return True, updated
+
+    def sign(self, data):
+        return hmac.new(self.key, data, hashlib.sha256).digest()
+
+    def load(self, path):
+        """Entry stored in path, None if it is missing, broken or not signed by key."""
+        if self.key is None:
+            return None
+        try:
+            with open(path, 'rb') as file:
+                data = file.read()
+        except OSError:
+            return None
+        digest, data = data[:DIGEST_SIZE], data[DIGEST_SIZE:]
+        if not hmac.compare_digest(digest, self.sign(data)):
+            return None
+        try:
+            return pickle.loads(data)
+        except (EOFError, pickle.PickleError, AttributeError, ImportError, ValueError):
+            return None
+
+    def get(self, root, pagename):
+        """Return (dependencies, resolved source, Root) of page or None."""
+        path = self.entry_path(pagename)
+        entry = self.load(path)
+        valid, updated = (self.is_valid(root, entry['states'])
+                          if entry is not None and entry.get('version') == self.version else (False, False))
+        with self._lock:
+            if not valid:
+                self.misses += 1
+                return None
+            self.hits += 1
+        if updated:
+            # e.g. after checkout, so the same files are not hashed by every build
+            self.save(path, entry)
+        else:
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+        return list(entry['dependencies']), entry['source'], entry['root']
+
+    def set(self, root, pagename, dependencies, source, tree):
+        """Store page, failures to write are ignored as cache is optional."""
+        entry = {
+            'version': self.version,
+            'dependencies': list(dependencies),
+            'states': self.file_states(root, dependencies),
+            'source': source,
+            'root': tree
+        }
+        self.save(self.entry_path(pagename), entry)
+
+    def save(self, path, entry):
+        if self.key is None:
+            return
+        tmp_path = '{0}.{1}.tmp'.format(path, os.getpid())
+        try:
+            data = pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL)
+            os.makedirs(self.path, exist_ok=True)
+            with open(tmp_path, 'wb') as file:
+                file.write(self.sign(data) + data)
+            os.replace(tmp_path, path)
+        except (OSError, pickle.PickleError, RecursionError):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def prune(self):
+        """Remove least recently used entries until cache fits max_size. Return number of removed."""
+        try:
+            entries = [x for x in os.scandir(self.path) if x.name.endswith(ENTRY_SUFFIX)]
+        except OSError:
+            return 0
+        stats = sorted(((x.stat(), x.path) for x in entries), key=lambda x: x[0].st_mtime_ns)
+        total = sum(st.st_size for st, path in stats)
+        removed = 0
+        for st, path in stats:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= st.st_size
+            removed += 1
+        return removed
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0
+        }
+
+
+def open_cache(path, max_size=DEFAULT_MAX_SIZE):
+    """DiskCache for path, one per process."""
+    with _caches_lock:
+        cache = _caches.get(path)
+        if cache is None or cache.max_size != max_size:
+            cache = _caches[path] = DiskCache(path, max_size)
+        return cache
+
+
+def opened_caches():
+    with _caches_lock:
+        return list(_caches.values())
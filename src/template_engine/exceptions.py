@@ -1,12 +1,17 @@
 """Exceptions of 'simple-template-engine'."""
-import logging
+
+
+def warn(message):
+    """Log warning, logging is imported only when something fails."""
+    import logging
+    logging.warning(message)
 
 
 class TemplateError(Exception):
     """Main template error."""
 
     def __init__(self):
-        logging.warning('Template error!')
+        warn('Template error!')
 
 
 class TemplateContextError(TemplateError):
@@ -15,7 +20,7 @@ class TemplateContextError(TemplateError):
     def __init__(self, context):
         super().__init__()
         self.context = context
-        logging.warning('Template context error!')
+        warn('Template context error!')
 
     def __str__(self):
         return 'Cannot resolve {0}'.format(self.context_var)
@@ -27,7 +32,7 @@ class TemplateSyntaxError(TemplateError):
     def __init(self, syntax_error):
         super().__init__()
         self.syntax_error = syntax_error
-        logging.warning('Template syntax error!')
+        warn('Template syntax error!')
 
     def __str__(self):
         return 'Invalid syntax {0}'.format(self.syntax_error)
@@ -39,7 +44,7 @@ class TemplateInheritanceError(TemplateError):
     def __init(self, inheritance_error):
         super().__init__()
         self.inheritance_error = inheritance_error
-        logging.warning('Template inheritance error!')
+        warn('Template inheritance error!')
 
     def __str__(self):
         return 'Invalid inheritance {0}'.format(self.inheritance_error)
@@ -51,7 +56,7 @@ class TemplateLoopInheritanceError(TemplateError):
     def __init(self, loop_error):
         super().__init__()
         self.loop_error = loop_error
-        logging.warning('Template loop error!')
+        warn('Template loop error!')
 
     def __str__(self):
         return 'Invalid inheritance {0}'.format(self.loop_error)
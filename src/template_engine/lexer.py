@@ -0,0 +1,58 @@
+"""Single pass scanner for all tags of templates."""
+import re
+from functools import lru_cache
+
+TEXT = 0
+INCLUDE = 1
+EXTENDS = 2
+BLOCK_START = 3
+BLOCK_END = 4
+VARIABLE = 5
+OPEN_TAG = 6
+CLOSE_TAG = 7
+
+TAG_REGEX = re.compile(r"\{#.*?#\}|\{!.*?!\}|\{\?.*?\?\}|\{\{.*?\}\}|\{%.*?%\}")
+
+
+class Token:
+    """Piece of template with its kind and cleaned content computed once."""
+
+    __slots__ = ('kind', 'raw', 'clean')
+
+    def __init__(self, kind, raw, clean=None):
+        self.kind = kind
+        self.raw = raw
+        self.clean = raw if clean is None else clean
+
+    def __repr__(self):
+        return 'Token({0}, {1!r})'.format(self.kind, self.raw)
+
+
+def make_tag(raw):
+    start = raw[:2]
+    clean = raw[2:-2].strip()
+    if start == '{#':
+        return Token(INCLUDE, raw, clean)
+    elif start == '{!':
+        return Token(EXTENDS, raw, clean.strip('"').strip("'"))
+    elif start == '{?':
+        return Token(BLOCK_END if 'endblock' in raw else BLOCK_START, raw, clean)
+    elif start == '{{':
+        return Token(VARIABLE, raw, clean)
+    return Token(CLOSE_TAG if clean[:3] == 'end' else OPEN_TAG, raw, clean)
+
+
+@lru_cache(maxsize=256)
+def tokenize(text):
+    """Split text into tuple of tokens in one linear scan."""
+    tokens = []
+    position = 0
+    for match in TAG_REGEX.finditer(text):
+        start = match.start()
+        if start > position:
+            tokens.append(Token(TEXT, text[position:start]))
+        tokens.append(make_tag(match.group()))
+        position = match.end()
+    if position < len(text):
+        tokens.append(Token(TEXT, text[position:]))
+    return tuple(tokens)
@@ -0,0 +1,61 @@
+"""Loaders used by Collector for reading template sources."""
+import os
+import threading
+from collections import OrderedDict
+
+
+class FileSystemLoader:
+    """Read files from disk and keep decoded text in a bounded cache.
+
+    Cached text is reused while (st_mtime_ns, st_size) of the file stay the same.
+    """
+
+    def __init__(self, max_entries=512, encoding=None):
+        self.max_entries = max_entries
+        self.encoding = encoding
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, path):
+        """Return text of file by path."""
+        path = os.path.normpath(path)
+        st = os.stat(path)
+        signature = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == signature:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        with open(path, 'r', encoding=self.encoding) as file:
+            text = str(file.read())
+        with self._lock:
+            self._entries[path] = (signature, text)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return text
+
+    def invalidate(self, *paths):
+        """Drop cached text for given paths, or everything if no paths given."""
+        with self._lock:
+            if not paths:
+                self._entries.clear()
+                return
+            for path in paths:
+                self._entries.pop(os.path.normpath(path), None)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0
+        }
+
+
+default_loader = FileSystemLoader()
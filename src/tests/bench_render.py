@@ -0,0 +1,78 @@
+"""Compare 'tree' and 'codegen' template backends.
+
+Repeated renders of one compiled template show the render loop alone, building
+every page of a synthetic site once through Collector.assemble_page_to shows
+what a real build pays, including generation of code for every page.
+
+Usage: python tests/bench_render.py [number of renders] [number of pages]
+"""
+import io
+import os
+import sys
+import time
+import shutil
+import timeit
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from template_engine.base import Collector, Template  # noqa: E402
+from benchmark import clear_caches, generate_site  # noqa: E402
+
+TEMPLATE = """<html>
+<head><title>{{ title }}</title></head>
+<body>
+{% array rows %}
+  <tr>
+  {% array item.cells %}
+    <td>{% if item > 2 %}<b>{{ item }}</b>{% else %}{{ item }}{% end %}</td>
+  {% end %}
+  <td>{{ ..title }}</td>
+  </tr>
+{% end %}
+{% if show_footer %}<footer>{{ footer.text }}</footer>{% end %}
+</body>
+</html>"""
+
+CONTEXT = {
+    'title': 'Benchmark',
+    'rows': [{'cells': list(range(10))} for _ in range(50)],
+    'show_footer': True,
+    'footer': {'text': 'footer'}
+}
+
+
+def build_pages(site, backend):
+    """Seconds to assemble every page of site once, with cold caches."""
+    clear_caches()
+    started = time.perf_counter()
+    for page in sorted(x for x in os.listdir(site) if x[-5:] == '.html'):
+        Collector(site, '/' + page, backend=backend).assemble_page_to(io.StringIO(), destionation_url='site')
+    return time.perf_counter() - started
+
+
+def main(number=200, pages=300):
+    tree = Template(TEMPLATE, cache=None, backend='tree')
+    codegen = Template(TEMPLATE, cache=None, backend='codegen')
+    if tree.render(**CONTEXT) != codegen.render(**CONTEXT):
+        print('Outputs of backends differ!')
+        sys.exit(1)
+    results = {}
+    for name, template in (('tree', tree), ('codegen', codegen)):
+        results[name] = min(timeit.repeat(lambda: template.render(**CONTEXT), number=number, repeat=5))
+        print('{0:>8}: {1:.4f}s for {2} renders'.format(name, results[name], number))
+    print(' speedup: {0:.2f}x'.format(results['tree'] / results['codegen']))
+
+    site = tempfile.mkdtemp(prefix='tssg-bench-')
+    try:
+        generate_site(site, pages=pages)
+        builds = {name: min(build_pages(site, name) for _ in range(3)) for name in ('tree', 'codegen')}
+    finally:
+        shutil.rmtree(site, ignore_errors=True)
+    for name in ('tree', 'codegen'):
+        print('{0:>8}: {1:.4f}s to build {2} pages'.format(name, builds[name], pages))
+    print(' speedup: {0:.2f}x'.format(builds['tree'] / builds['codegen']))
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:3]])
@@ -0,0 +1,73 @@
+"""Measure import time of CLI commands.
+
+Every command module is imported in a fresh interpreter with -X importtime,
+its cumulative import time is compared with a budget, and modules which
+only other commands need must not be imported by it:
+
+    python tests/bench_startup.py
+    python tests/bench_startup.py --budget 50 --repeat 5
+
+The same check runs in the test suite, see test_startup.py.
+"""
+import os
+import sys
+import argparse
+import subprocess
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BUDGET = 100.0
+
+COMMANDS = {
+    'build': ('generator', ('http.server', 'email.utils', 'mimetypes', 'watchcat', 'concurrent.futures', 'logging')),
+    'serve': ('server', ('watchcat', 'concurrent.futures', 'logging')),
+    'daemon --send': ('daemon_client', ('generator', 'template_engine', 'http.server', 'watchcat', 'logging')),
+    'new': ('scaffold', ('generator', 'template_engine', 'http.server', 'watchcat', 'concurrent.futures', 'logging')),
+}
+
+
+def import_times(module):
+    """{module: cumulative microseconds} of a fresh 'import module'."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+                            cwd=SRC_DIR, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or line.endswith('| imported package'):
+            continue
+        self_time, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def check_command(command, budget=DEFAULT_BUDGET, repeat=3):
+    """(fastest import time in milliseconds, list of problems) of command from COMMANDS."""
+    module, forbidden = COMMANDS[command]
+    runs = [import_times(module) for _ in range(max(repeat, 1))]
+    best = min(x[module] for x in runs) / 1000.0
+    imported = [x for x in forbidden if x in runs[0]]
+    problems = []
+    if best > budget:
+        problems.append('over budget')
+    if imported:
+        problems.append('imports ' + ', '.join(imported))
+    return best, problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET,
+                        help='Limit of import time of every command in milliseconds.')
+    parser.add_argument('--repeat', type=int, default=3, help='Fastest of this many runs is taken.')
+    args = parser.parse_args()
+
+    failed = False
+    for command, (module, forbidden) in sorted(COMMANDS.items()):
+        best, problems = check_command(command, args.budget, args.repeat)
+        failed = failed or bool(problems)
+        status = '; '.join(problems) or 'ok'
+        print('{0:>13}: {1:7.1f}ms  {2:<13} {3}'.format(command, best, module, status))
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
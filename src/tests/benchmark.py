@@ -0,0 +1,201 @@
+"""Benchmark of build pipeline on synthetic sites.
+
+Generates a site of configurable shape, builds it with build_file like a real
+build, times lex, compile, render, write and asset-copy phases separately with
+the build profiler, records peak memory and writes JSON results. Results can be
+compared against a stored baseline of the same shape and backend:
+
+    python tests/benchmark.py --pages 500 --output results.json
+    python tests/benchmark.py --pages 500 --baseline results.json --threshold 0.2
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from template_engine.cache import template_cache  # noqa: E402
+from template_engine.lexer import tokenize  # noqa: E402
+from template_engine.loader import default_loader  # noqa: E402
+from assets import sync_assets  # noqa: E402
+from generator import build_file  # noqa: E402
+import profiler  # noqa: E402
+
+PHASES = ('lex', 'compile', 'render', 'write', 'assets')
+# phases of profiler summed into phases of benchmark, build_file is its own time: temporary file and replace
+PROFILER_PHASES = {
+    'prepare_page': 'lex',
+    'prepare_include_tags': 'lex',
+    'compile': 'compile',
+    'render': 'render',
+    'write': 'write',
+    'build_file': 'write'
+}
+
+
+def generate_site(path, pages=100, include_depth=3, inheritance_depth=2, loop_size=20,
+                  if_density=0.3, assets=20, seed=0):
+    """Write synthetic site into path."""
+    rnd = random.Random(seed)
+    os.makedirs(os.path.join(path, 'templates'))
+    os.makedirs(os.path.join(path, 'css'))
+    for level in range(include_depth):
+        include = '{{# templates/partial_{0}.html #}}'.format(level + 1) if level + 1 < include_depth else ''
+        with open(os.path.join(path, 'templates', 'partial_{0}.html'.format(level)), 'w') as f:
+            f.write('<div class="partial-{0}">\n  <p>Partial text {0}</p>\n  {1}\n</div>\n'.format(level, include))
+    with open(os.path.join(path, 'templates', 'layout_0.html'), 'w') as f:
+        f.write('<!DOCTYPE html>\n<html>\n<head><link rel="stylesheet" href="/css/style_0.css" /></head>\n'
+                '<body>\n{# templates/partial_0.html #}\n{? body_0 ?}default{? endblock ?}\n</body>\n</html>\n'
+                if include_depth else
+                '<!DOCTYPE html>\n<html>\n<body>\n{? body_0 ?}default{? endblock ?}\n</body>\n</html>\n')
+    for level in range(1, inheritance_depth):
+        with open(os.path.join(path, 'templates', 'layout_{0}.html'.format(level)), 'w') as f:
+            f.write('{{! templates/layout_{0}.html !}}\n{{? body_{0} ?}}<section class="level-{1}">\n'
+                    '{{? body_{1} ?}}default{{? endblock ?}}\n</section>{{? endblock ?}}\n'.format(level - 1, level))
+    for number in range(pages):
+        body = ['<h1>Page {0}</h1>'.format(number)]
+        for block in range(3):
+            body.append('<ul>\n{{% array {0} %}}\n  <li>'.format(list(range(loop_size))))
+            if rnd.random() < if_density:
+                body.append('{% if item > 3 %}<b>{{ item }}</b>{% else %}{{ item }}{% end %}')
+            else:
+                body.append('{{ item }} of {{ ..destionation_url }}')
+            body.append('</li>\n{% end %}\n</ul>')
+        with open(os.path.join(path, 'page_{0}.html'.format(number)), 'w') as f:
+            if inheritance_depth:
+                f.write('{{! templates/layout_{0}.html !}}\n{{? body_{0} ?}}\n{1}\n{{? endblock ?}}\n'.format(
+                    inheritance_depth - 1, '\n'.join(body)))
+            else:
+                f.write('\n'.join(body))
+    for number in range(assets):
+        with open(os.path.join(path, 'css', 'style_{0}.css'.format(number)), 'w') as f:
+            f.write('.class-{0} {{ color: #{1:06x}; }}\n'.format(number, rnd.randrange(0xffffff)) * 50)
+
+
+def clear_caches():
+    tokenize.cache_clear()
+    default_loader.invalidate()
+    template_cache.clear()
+
+
+def build(site, output, backend='tree', profile=True):
+    """
+    Build all pages of site into emptied output with build_file, return timings of phases.
+
+    Pages are streamed into temporary files and moved over outputs like in a real build.
+    Without profile only assets and total time are measured.
+    """
+    timings = dict.fromkeys(PHASES, 0.0)
+    shutil.rmtree(output, ignore_errors=True)
+    os.makedirs(output)
+    destination = os.path.relpath(output, site)
+    pages = sorted(x for x in os.listdir(site) if x[-5:] == '.html')
+    prof = profiler.enable() if profile else None
+    try:
+        for page in pages:
+            build_file(page, destination, root=site, backend=backend)
+    finally:
+        profiler.disable()
+    if prof is not None:
+        for name, value in prof.phase_times().items():
+            if name in PROFILER_PHASES:
+                timings[PROFILER_PHASES[name]] += value
+    started = time.perf_counter()
+    sync_assets(site, destination)
+    timings['assets'] = time.perf_counter() - started
+    return timings
+
+
+def run(shape, repeat=3, backend='tree'):
+    """Best timings of `repeat` cold builds and peak memory of one more build."""
+    workdir = tempfile.mkdtemp(prefix='tssg-bench-')
+    try:
+        site = os.path.join(workdir, 'src')
+        generate_site(site, **shape)
+        output = os.path.join(site, 'site')
+        best = {}
+        for _ in range(repeat):
+            clear_caches()
+            for phase, value in build(site, output, backend).items():
+                best[phase] = min(best.get(phase, value), value)
+        clear_caches()
+        tracemalloc.start()
+        build(site, output, backend, profile=False)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    best['total'] = sum(best[x] for x in PHASES)
+    return {'shape': shape, 'backend': backend, 'timings': best, 'peak_memory': peak}
+
+
+def compare(results, baseline, threshold):
+    """
+    Phases which became slower than baseline by more than threshold.
+
+    Raise ValueError if baseline was measured on another shape of site or with another backend.
+    """
+    for key in ('shape', 'backend'):
+        if baseline.get(key) != results[key]:
+            raise ValueError('Baseline {0} {1} differs from {2}'.format(key, baseline.get(key), results[key]))
+    regressions = []
+    for phase, value in sorted(baseline['timings'].items()):
+        current = results['timings'].get(phase)
+        if current is not None and value > 0 and current > value * (1 + threshold):
+            regressions.append((phase, value, current))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark of build pipeline.')
+    parser.add_argument('--pages', type=int, default=100)
+    parser.add_argument('--include-depth', type=int, default=3)
+    parser.add_argument('--inheritance-depth', type=int, default=2)
+    parser.add_argument('--loop-size', type=int, default=20)
+    parser.add_argument('--if-density', type=float, default=0.3)
+    parser.add_argument('--assets', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--backend', default='tree', choices=['tree', 'codegen'])
+    parser.add_argument('--output', help='File for JSON results.')
+    parser.add_argument('--baseline', help='JSON results to compare with.')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Allowed slowdown, 0.2 is 20%%.')
+    args = parser.parse_args(argv)
+
+    shape = {
+        'pages': args.pages,
+        'include_depth': args.include_depth,
+        'inheritance_depth': args.inheritance_depth,
+        'loop_size': args.loop_size,
+        'if_density': args.if_density,
+        'assets': args.assets
+    }
+    results = run(shape, repeat=args.repeat, backend=args.backend)
+    for phase in PHASES + ('total',):
+        print('{0:>8}: {1:.4f}s'.format(phase, results['timings'][phase]))
+    print('    peak: {0:.1f} MB'.format(results['peak_memory'] / 1024 / 1024))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        try:
+            regressions = compare(results, baseline, args.threshold)
+        except ValueError as e:
+            print('Cannot compare with {0}: {1}'.format(args.baseline, e))
+            return 1
+        for phase, before, after in regressions:
+            print('Regression in {0}: {1:.4f}s -> {2:.4f}s'.format(phase, before, after))
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,12 @@
+"""Run every test_*.py of this directory: python tests/run_tests.py"""
+import os
+import sys
+import unittest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+if __name__ == '__main__':
+    suite = unittest.defaultTestLoader.discover(TESTS_DIR, top_level_dir=TESTS_DIR)
+    result = unittest.TextTestRunner(verbosity=1).run(suite)
+    sys.exit(not result.wasSuccessful())
@@ -0,0 +1,78 @@
+"""Incremental sync of asset folders."""
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from assets import sync_assets, sync_dir  # noqa: E402
+
+
+class SyncDirTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.tmp.name, 'css')
+        self.target = os.path.join(self.tmp.name, 'site', 'css')
+        self.write(self.source, 'style.css', 'a')
+        self.write(self.source, 'vendor/grid.css', 'b')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, folder, name, text):
+        path = os.path.join(folder, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(text)
+
+    def read(self, name):
+        with open(os.path.join(self.target, name)) as f:
+            return f.read()
+
+    def test_copy_then_skip(self):
+        self.assertEqual(sync_dir(self.source, self.target), (2, 0, 0))
+        self.assertEqual(self.read('vendor/grid.css'), 'b')
+        self.assertEqual(sync_dir(self.source, self.target), (0, 2, 0))
+        self.write(self.source, 'style.css', 'changed')
+        self.assertEqual(sync_dir(self.source, self.target), (1, 1, 0))
+        self.assertEqual(self.read('style.css'), 'changed')
+
+    def test_removed_files_and_empty_folders(self):
+        sync_dir(self.source, self.target)
+        os.remove(os.path.join(self.source, 'vendor', 'grid.css'))
+        self.write(self.target, 'stale.css', 'x')
+        self.assertEqual(sync_dir(self.source, self.target), (0, 1, 2))
+        self.assertEqual(sorted(os.listdir(self.target)), ['style.css'])
+
+    def test_derived_files_are_kept(self):
+        sync_dir(self.source, self.target)
+        for name in ('style.css.gz', 'style.0123456789.css', 'style.0123456789.css.gz', 'gone.css.gz',
+                     'gone.0123456789.css'):
+            self.write(self.target, name, 'x')
+        self.assertEqual(sync_dir(self.source, self.target)[2], 4)
+        self.assertEqual(sorted(os.listdir(self.target)), ['style.css', 'style.css.gz', 'vendor'])
+        for name in ('style.0123456789.css', 'style.0123456789.css.gz'):
+            self.write(self.target, name, 'x')
+        self.assertEqual(sync_dir(self.source, self.target, fingerprint=True)[2], 0)
+
+    def test_link(self):
+        sync_dir(self.source, self.target, link=True)
+        self.assertTrue(os.path.samefile(os.path.join(self.source, 'style.css'),
+                                         os.path.join(self.target, 'style.css')))
+        self.assertEqual(sync_dir(self.source, self.target, link=True), (0, 2, 0))
+
+    def test_sync_assets_drops_removed_folders(self):
+        root = self.tmp.name
+        self.write(root, 'js/app.js', 'js')
+        self.assertEqual(sync_assets(root, 'site'), (3, 0, 0))
+        self.assertTrue(os.path.exists(os.path.join(root, 'site', 'js', 'app.js')))
+        os.remove(os.path.join(root, 'js', 'app.js'))
+        os.rmdir(os.path.join(root, 'js'))
+        sync_assets(root, 'site')
+        self.assertFalse(os.path.exists(os.path.join(root, 'site', 'js')))
+
+
+if __name__ == '__main__':
+    unittest.main()
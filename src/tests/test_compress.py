@@ -0,0 +1,63 @@
+"""Precompressed copies of output files."""
+import os
+import sys
+import gzip
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compress import compress_tree, is_up_to_date  # noqa: E402
+
+
+class CompressTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dest = self.tmp.name
+        self.path = os.path.join(self.dest, 'style.css')
+        self.write('p { color: red }' * 20, mtime=2000000000)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, text, mtime):
+        with open(self.path, 'w') as f:
+            f.write(text)
+        os.utime(self.path, (mtime, mtime))
+
+    def compressed(self):
+        with gzip.open(self.path + '.gz', 'rt') as f:
+            return f.read()
+
+    def test_compress_once(self):
+        self.assertEqual(compress_tree(self.dest, level=9), 1)
+        self.assertTrue(is_up_to_date(self.path, self.path + '.gz'))
+        self.assertEqual(compress_tree(self.dest, level=9), 0)
+
+    def test_file_replaced_by_older_one(self):
+        compress_tree(self.dest, level=9)
+        self.write('b { color: blue }' * 20, mtime=1000000000)
+        self.assertFalse(is_up_to_date(self.path, self.path + '.gz'))
+        self.assertEqual(compress_tree(self.dest, level=9), 1)
+        self.assertEqual(self.compressed(), 'b { color: blue }' * 20)
+
+    def test_same_mtime_other_size(self):
+        compress_tree(self.dest, level=9)
+        self.write('p { color: red }' * 21, mtime=2000000000)
+        self.assertFalse(is_up_to_date(self.path, self.path + '.gz'))
+
+    def test_level_change_recompresses(self):
+        compress_tree(self.dest, level=9)
+        self.assertEqual(compress_tree(self.dest, level=1), 1)
+        self.assertEqual(compress_tree(self.dest, level=1), 0)
+
+    def test_orphan_is_removed(self):
+        compress_tree(self.dest, level=9)
+        os.remove(self.path)
+        compress_tree(self.dest, level=9)
+        self.assertFalse(os.path.exists(self.path + '.gz'))
+
+
+if __name__ == '__main__':
+    unittest.main()
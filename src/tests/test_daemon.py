@@ -0,0 +1,127 @@
+"""Requests of build daemon and rebuilds of its watcher."""
+import io
+import os
+import sys
+import tempfile
+import threading
+import unittest
+import contextlib
+from concurrent.futures import BrokenExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from daemon import BuildDaemon, DaemonServer  # noqa: E402
+from daemon_client import send_request  # noqa: E402
+
+
+class BuildDaemonTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        self.write('templates/header.html', '<h1>{{ title }}</h1>')
+        self.write('index.html', 'index')
+        self.write('about.html', '{# templates/header.html #}about')
+        self.write('notes/draft.html', 'draft')
+        os.makedirs(self.output(''))
+        self.daemon = BuildDaemon(self.root, 'site', jobs=1, ignore=('notes/',))
+        self.addCleanup(self.daemon.close)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, text):
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(text)
+
+    def output(self, name):
+        return os.path.join(self.root, 'site', name)
+
+    def handle(self, request):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return self.daemon.handle(request)
+
+    def test_bad_requests(self):
+        self.assertEqual(self.handle(['build']), {'ok': False, 'error': 'Request must be a JSON object'})
+        self.assertEqual(self.handle({'command': 'clean'}), {'ok': False, 'error': 'Unknown command: clean'})
+        self.assertEqual(self.handle({'command': 'build-page'}), {'ok': False, 'error': "'build-page' needs 'page'"})
+        for page in ('../index.html', 'missing.html', 'notes/draft.html', 'templates/header.html'):
+            response = self.handle({'command': 'build-page', 'page': page})
+            self.assertFalse(response['ok'])
+            self.assertTrue(response['error'].startswith('Not a page: '))
+        self.assertEqual(self.daemon.builds, 0)
+
+    def test_build(self):
+        response = self.handle({'command': 'build'})
+        self.assertEqual((response['ok'], response['built'], response['errors']), (True, 2, []))
+        self.assertEqual(self.handle({'command': 'build'})['built'], 0)
+        self.assertEqual(self.handle({'command': 'build', 'full': True})['built'], 2)
+        self.assertEqual(self.handle({'command': 'build-page', 'page': './index.html'})['built'], 1)
+        stats = self.handle({'command': 'stats'})
+        self.assertEqual((stats['ok'], stats['builds'], stats['pages']), (True, 4, 2))
+        self.assertFalse(os.path.exists(self.output('notes/draft.html')))
+
+    def test_build_errors(self):
+        self.handle({'command': 'build'})
+        self.write('index.html', '{% if title %}')
+        response = self.handle({'command': 'build'})
+        self.assertFalse(response['ok'])
+        self.assertEqual([x['page'] for x in response['errors']], ['index.html'])
+        with open(self.output('index.html')) as f:
+            self.assertEqual(f.read(), 'index')
+
+    def test_full_build_removes_deleted_pages(self):
+        self.handle({'command': 'build'})
+        os.remove(os.path.join(self.root, 'about.html'))
+        self.assertEqual(self.handle({'command': 'build', 'full': True})['built'], 1)
+        self.assertFalse(os.path.exists(self.output('about.html')))
+        self.assertNotIn('about.html', self.daemon.manifest.pages)
+
+    def test_on_change_rebuilds_dependents(self):
+        self.handle({'command': 'build'})
+        index = os.stat(self.output('index.html')).st_ino
+        self.write('templates/header.html', '<h2>{{ title }}</h2>')
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.daemon.on_change([os.path.join(self.root, 'templates/header.html')])
+        with open(self.output('about.html')) as f:
+            self.assertEqual(f.read(), '<h2></h2>about')
+        self.assertEqual(os.stat(self.output('index.html')).st_ino, index)
+        self.assertEqual(self.daemon.builds, 2)
+
+    def test_broken_pool_is_restarted(self):
+        daemon = BuildDaemon(self.root, 'site', jobs=2, ignore=('notes/',))
+        self.addCleanup(daemon.close)
+        executor = daemon.executor
+        calls = []
+
+        def build():
+            calls.append(daemon.executor)
+            if len(calls) == 1:
+                raise BrokenExecutor('killed')
+            return 'built'
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(daemon.run(build), 'built')
+        self.assertIsNot(daemon.executor, executor)
+        self.assertIs(daemon.options['executor'], daemon.executor)
+        self.assertEqual(calls, [executor, daemon.executor])
+        self.assertEqual(daemon.handle({'command': 'build'})['built'], 2)
+
+    def test_socket(self):
+        path = os.path.join(self.root, 'daemon.sock')
+        server = DaemonServer(path, self.daemon)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                self.assertEqual(send_request({'command': 'build'}, path, timeout=10)['built'], 2)
+            self.assertTrue(send_request({'command': 'stats'}, path, timeout=10)['ok'])
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+
+if __name__ == '__main__':
+    unittest.main()
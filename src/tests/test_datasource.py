@@ -0,0 +1,117 @@
+"""Data driven pages: bindings, records and pagination."""
+import io
+import os
+import sys
+import json
+import tempfile
+import unittest
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datasource import DataBinding, DataBindingError, find_bindings  # noqa: E402
+from manifest import BuildManifest  # noqa: E402
+from generator import update_pages  # noqa: E402
+
+
+class DataBindingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        os.makedirs(os.path.join(self.root, 'data'))
+        os.makedirs(os.path.join(self.root, 'templates'))
+        os.makedirs(os.path.join(self.root, 'site'))
+        self.write('templates/item.html', '<p>{{ record.name }} {{ index }}</p>')
+        self.write('templates/list.html', '{% array items %}{{ item.name }},{% end %}'
+                                          '|{{ page }}|{{ previous_url }}|{{ next_url }}')
+        self.records(3)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, text):
+        with open(os.path.join(self.root, name), 'w') as f:
+            f.write(text)
+
+    def records(self, count):
+        self.write('data/items.jsonl', ''.join(json.dumps({'id': i, 'name': 'n{0}'.format(i)}) + '\n\n'
+                                               for i in range(count)))
+
+    def binding(self, name='items.data.json', **options):
+        data = dict({'template': 'templates/item.html', 'source': 'data/items.jsonl', 'output': 'item-{id}.html'},
+                    **options)
+        self.write(name, json.dumps(data))
+        return DataBinding.load(self.root, name)
+
+    def test_page_per_record(self):
+        pages = list(self.binding().pages(self.root))
+        self.assertEqual([name for name, context in pages], ['item-0.html', 'item-1.html', 'item-2.html'])
+        self.assertEqual(pages[1][1], {'record': {'id': 1, 'name': 'n1'}, 'index': 1})
+
+    def test_csv(self):
+        self.write('data/items.csv', 'id,name\n7,seven\n8,eight\n')
+        pages = list(self.binding(source='data/items.csv').pages(self.root))
+        self.assertEqual([(name, context['record']['name']) for name, context in pages],
+                         [('item-7.html', 'seven'), ('item-8.html', 'eight')])
+
+    def test_pagination(self):
+        for count, names in ((0, []), (2, ['list-1.html']), (4, ['list-1.html', 'list-2.html']),
+                             (5, ['list-1.html', 'list-2.html', 'list-3.html'])):
+            self.records(count)
+            pages = list(self.binding(output='list-{page}.html', per_page=2).pages(self.root))
+            self.assertEqual([name for name, context in pages], names)
+        self.assertEqual([len(context['items']) for name, context in pages], [2, 2, 1])
+        self.assertEqual([(context['previous_url'], context['next_url']) for name, context in pages],
+                         [('', 'list-2.html'), ('list-1.html', 'list-3.html'), ('list-2.html', '')])
+
+    def test_errors(self):
+        for options in ({'per_page': 0}, {'source': 'data/items.xml'}, {'output': '../item-{id}.html'},
+                        {'output': 'item-{missing}.html'}):
+            with self.assertRaises(DataBindingError):
+                list(self.binding(**options).pages(self.root))
+        self.write('broken.data.json', '{"template": "templates/item.html"}')
+        with self.assertRaises(DataBindingError):
+            DataBinding.load(self.root, 'broken.data.json')
+        self.write('data/items.jsonl', '{"id": 1}\nnot json\n')
+        with self.assertRaises(DataBindingError):
+            list(self.binding().pages(self.root))
+
+    def test_find_bindings(self):
+        self.binding()
+        self.binding('list.data.json')
+        self.assertEqual(find_bindings(self.root), ['items.data.json', 'list.data.json'])
+
+    def build(self, manifest):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return update_pages(manifest, ['items.data.json'], 'site', root=self.root)
+
+    def test_build_and_remove_stale_outputs(self):
+        self.binding()
+        manifest = BuildManifest(self.root, 'site')
+        errors, counts = self.build(manifest)
+        self.assertEqual((errors, counts['built']), ([], 3))
+        with open(os.path.join(self.root, 'site', 'item-2.html')) as f:
+            self.assertEqual(f.read(), '<p>n2 2</p>')
+        self.assertEqual(manifest.generated['items.data.json'], ['item-0.html', 'item-1.html', 'item-2.html'])
+        self.assertEqual(manifest.pages['items.data.json'],
+                         ['data/items.jsonl', 'items.data.json', 'templates/item.html'])
+        self.records(2)
+        self.build(manifest)
+        self.assertEqual(sorted(os.listdir(os.path.join(self.root, 'site'))),
+                         ['.tssg-manifest.json', 'item-0.html', 'item-1.html'])
+
+    def test_failed_binding_keeps_outputs(self):
+        self.binding()
+        manifest = BuildManifest(self.root, 'site')
+        self.build(manifest)
+        self.write('data/items.jsonl', '{"id": 0, "name": "new"}\nnot json\n')
+        errors, counts = self.build(manifest)
+        self.assertEqual(len(errors), 1)
+        self.assertTrue(os.path.exists(os.path.join(self.root, 'site', 'item-2.html')))
+        self.assertEqual(manifest.outputs('items.data.json'), ['item-0.html', 'item-1.html', 'item-2.html'])
+        self.assertNotIn('items.data.json', manifest.pages)
+
+
+if __name__ == '__main__':
+    unittest.main()
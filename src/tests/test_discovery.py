@@ -0,0 +1,66 @@
+"""Ignore patterns and recursive page discovery."""
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from discovery import IgnorePatterns, find_pages, output_ignore  # noqa: E402
+from generator import page_patterns  # noqa: E402
+
+
+class IgnorePatternsTest(unittest.TestCase):
+
+    def test_name_matches_at_any_depth(self):
+        patterns = IgnorePatterns(('.*', '*.tmp'))
+        self.assertTrue(patterns.is_ignored('.git'))
+        self.assertTrue(patterns.is_ignored('blog/.hidden/page.html'))
+        self.assertTrue(patterns.is_ignored('blog/a.html.tmp'))
+        self.assertFalse(patterns.is_ignored('blog/a.html'))
+
+    def test_anchored(self):
+        patterns = IgnorePatterns(('/site', 'blog/drafts'))
+        self.assertTrue(patterns.is_ignored('site/index.html'))
+        self.assertFalse(patterns.is_ignored('docs/site/index.html'))
+        self.assertTrue(patterns.is_ignored('blog/drafts/a.html'))
+        self.assertFalse(patterns.is_ignored('old/blog/drafts/a.html'))
+
+    def test_directories_only(self):
+        patterns = IgnorePatterns(('templates/',))
+        self.assertTrue(patterns.is_ignored('templates/header.html'))
+        self.assertTrue(patterns.is_ignored('templates', is_dir=True))
+        self.assertFalse(patterns.is_ignored('templates', is_dir=False))
+
+    def test_output_ignore(self):
+        patterns = IgnorePatterns(output_ignore('./public/'))
+        self.assertTrue(patterns.is_ignored('public/index.html'))
+        self.assertTrue(patterns.is_ignored('public.snapshots/1/index.html'))
+        self.assertFalse(patterns.is_ignored('publication.html'))
+
+
+class FindPagesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        for path in ('index.html', 'blog/post.html', 'docs/js/intro.html', 'docs/css/x.html', 'js/app.html',
+                     'css/a.html', 'templates/base.html', 'site/index.html', 'site.snapshots/1/index.html',
+                     '.git/x.html', 'blog/draft.tmp', 'notes.txt'):
+            path = os.path.join(self.root, path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            open(path, 'w').close()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_only_top_level_asset_folders_are_skipped(self):
+        self.assertEqual(find_pages(self.root, page_patterns('site')),
+                         ['blog/post.html', 'docs/css/x.html', 'docs/js/intro.html', 'index.html'])
+
+    def test_user_patterns(self):
+        self.assertEqual(find_pages(self.root, page_patterns('site', ('docs/',))), ['blog/post.html', 'index.html'])
+
+
+if __name__ == '__main__':
+    unittest.main()
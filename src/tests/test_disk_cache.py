@@ -0,0 +1,121 @@
+"""Persistent cache of compiled pages: invalidation and signed entries."""
+import os
+import sys
+import pickle
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from template_engine import disk_cache  # noqa: E402
+from template_engine.base import Collector  # noqa: E402
+from template_engine.disk_cache import DiskCache, user_key  # noqa: E402
+
+KEY = b'k' * 32
+EXECUTED = []
+
+
+class Payload(object):
+
+    def __reduce__(self):
+        return EXECUTED.append, ('executed',)
+
+
+class DiskCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        os.makedirs(os.path.join(self.root, 'templates'))
+        self.write('templates/header.html', '<h1>{{ title }}</h1>')
+        self.write('page.html', '{# templates/header.html #}page')
+        self.cache = self.open()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def open(self, key=KEY):
+        return DiskCache(os.path.join(self.root, '.tssg-cache'), key=key)
+
+    def write(self, name, text, mtime=None):
+        path = os.path.join(self.root, name)
+        with open(path, 'w') as f:
+            f.write(text)
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+
+    def assemble(self, cache=None):
+        return Collector(self.root, '/page.html', disk_cache=cache or self.cache).assemble_page(title='T')
+
+    def test_hit_after_store(self):
+        self.assertEqual(self.assemble(), '<h1>T</h1>page')
+        self.assertEqual(self.cache.stats()['misses'], 1)
+        other = self.open()
+        self.assertEqual(self.assemble(other), '<h1>T</h1>page')
+        self.assertEqual(other.stats()['hits'], 1)
+
+    def test_changed_template_is_miss(self):
+        self.assemble()
+        self.write('templates/header.html', '<h2>{{ title }}</h2>')
+        other = self.open()
+        self.assertEqual(self.assemble(other), '<h2>T</h2>page')
+        self.assertEqual(other.stats()['misses'], 1)
+
+    def test_same_size_change_is_miss(self):
+        self.write('templates/header.html', '<h1>{{ title }}</h1>', mtime=1000000000)
+        self.assemble()
+        self.write('templates/header.html', '<p1>{{ title }}</p1>', mtime=1000000001)
+        self.assertEqual(self.assemble(self.open()), '<p1>T</p1>page')
+
+    def test_touched_file_is_hashed_once(self):
+        self.assemble()
+        self.write('templates/header.html', '<h1>{{ title }}</h1>', mtime=1000000000)
+        hashed = []
+        original = disk_cache.source_hash
+        disk_cache.source_hash = lambda path: hashed.append(path) or original(path)
+        try:
+            first, second = self.open(), self.open()
+            self.assemble(first)
+            self.assemble(second)
+        finally:
+            disk_cache.source_hash = original
+        self.assertEqual((first.hits, second.hits), (1, 1))
+        self.assertEqual(len(hashed), 1)
+
+    def test_entry_of_another_key_is_not_loaded(self):
+        self.assemble()
+        other = self.open(key=b'x' * 32)
+        self.assertEqual(self.assemble(other), '<h1>T</h1>page')
+        self.assertEqual(other.stats()['misses'], 1)
+
+    def test_unsigned_pickle_is_not_executed(self):
+        self.assemble()
+        path = self.cache.entry_path(Collector(self.root, '/page.html').pagename)
+        self.assertTrue(os.path.exists(path))
+        for data in (pickle.dumps(Payload()), b'\0' * 32 + pickle.dumps(Payload())):
+            with open(path, 'wb') as f:
+                f.write(data)
+            self.assertEqual(self.assemble(self.open()), '<h1>T</h1>page')
+        self.assertEqual(EXECUTED, [])
+
+    def test_prune(self):
+        self.assemble()
+        cache = DiskCache(self.cache.path, max_size=0, key=KEY)
+        self.assertEqual(cache.prune(), 1)
+
+
+class UserKeyTest(unittest.TestCase):
+
+    def test_key_is_created_once(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'tssg', 'key')
+            key = user_key(path)
+            self.assertEqual(len(key), 32)
+            self.assertEqual(os.stat(path).st_mode & 0o777, 0o600)
+            user_key.cache_clear()
+            self.assertEqual(user_key(path), key)
+            self.assertEqual(sorted(os.listdir(os.path.dirname(path))), ['key'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+"""Dependency manifest and incremental builds."""
+import io
+import os
+import sys
+import tempfile
+import unittest
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from manifest import BuildManifest  # noqa: E402
+from generator import update_site  # noqa: E402
+
+
+class ManifestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        os.makedirs(os.path.join(self.root, 'templates'))
+        os.makedirs(os.path.join(self.root, 'site'))
+        self.write('templates/header.html', '<h1>{{ destionation_url }}</h1>')
+        self.write('index.html', '{# templates/header.html #}index')
+        self.write('about.html', 'about')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, text, mtime=None):
+        path = os.path.join(self.root, name)
+        with open(path, 'w') as f:
+            f.write(text)
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+
+    def output(self, name):
+        return os.path.join(self.root, 'site', name)
+
+    def build(self, pages=('about.html', 'index.html'), manifest=None, **options):
+        manifest = manifest or BuildManifest(self.root, 'site').load()
+        with contextlib.redirect_stdout(io.StringIO()):
+            errors, counts = update_site(manifest, list(pages), 'site', root=self.root, **options)
+        self.assertEqual(errors, [])
+        return counts['built']
+
+    def test_record_and_reload(self):
+        manifest = BuildManifest(self.root, 'site')
+        manifest.record('index.html', ['index.html', './templates/header.html'])
+        manifest.save()
+        loaded = BuildManifest(self.root, 'site').load()
+        self.assertEqual(loaded.pages, {'index.html': ['index.html', 'templates/header.html']})
+        self.assertEqual(loaded.dependents('templates/header.html'), ['index.html'])
+        self.assertEqual(loaded.files['index.html'][1], len('{# templates/header.html #}index'))
+
+    def test_unusable_manifest_is_empty(self):
+        with open(BuildManifest(self.root, 'site').path, 'w') as f:
+            f.write('{"version": 0, "pages": {"a.html": []}}')
+        self.assertEqual(BuildManifest(self.root, 'site').load().pages, {})
+
+    def test_only_outdated_pages_are_built(self):
+        self.assertEqual(self.build(), 2)
+        self.assertEqual(self.build(), 0)
+        self.write('templates/header.html', '<h2>{{ destionation_url }}</h2>')
+        self.assertEqual(self.build(), 1)
+        os.remove(self.output('about.html'))
+        self.assertEqual(self.build(), 1)
+
+    def test_touched_file_with_same_content_is_not_rebuilt(self):
+        self.build()
+        self.write('about.html', 'about', mtime=1000000000)
+        self.assertEqual(self.build(), 0)
+
+    def test_changed_settings_rebuild_all(self):
+        self.build()
+        self.assertEqual(self.build(minify=True), 2)
+        self.assertEqual(self.build(minify=True), 0)
+
+    def test_removed_page(self):
+        self.build()
+        os.remove(os.path.join(self.root, 'about.html'))
+        self.assertEqual(BuildManifest(self.root, 'site').load().removed_pages(['index.html']), ['about.html'])
+        self.build(['index.html'])
+        self.assertFalse(os.path.exists(self.output('about.html')))
+        self.assertNotIn('about.html', BuildManifest(self.root, 'site').load().pages)
+
+    def test_removed_page_with_full(self):
+        self.build()
+        os.remove(os.path.join(self.root, 'about.html'))
+        self.assertEqual(self.build(['index.html'], full=True), 1)
+        self.assertFalse(os.path.exists(self.output('about.html')))
+
+    def test_same_instance_is_reused(self):
+        manifest = BuildManifest(self.root, 'site').load()
+        self.assertEqual(self.build(manifest=manifest), 2)
+        self.assertEqual(self.build(manifest=manifest), 0)
+        self.write('index.html', 'new index')
+        self.assertEqual(self.build(manifest=manifest), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+"""Varint codec, index encoding and lookups of search index."""
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import search  # noqa: E402
+from search import SearchIndex, decode_varint, encode_varint, lookup, read_header, update_index  # noqa: E402
+
+
+class VarintTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        values = [0, 1, 0x7f, 0x80, 0x3fff, 0x4000, 2 ** 32, 2 ** 63 + 5]
+        data = bytearray()
+        for value in values:
+            encode_varint(value, data)
+        offset = 0
+        for value in values:
+            decoded, offset = decode_varint(data, offset)
+            self.assertEqual(decoded, value)
+        self.assertEqual(offset, len(data))
+
+    def test_sizes(self):
+        for value, size in ((0, 1), (0x7f, 1), (0x80, 2), (0x3fff, 2), (0x4000, 3)):
+            data = bytearray()
+            encode_varint(value, data)
+            self.assertEqual(len(data), size)
+
+
+class SearchIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.directory = self.tmp.name
+        self.pages = {
+            'index.html': ('Home', {'hello': [0, 5], 'world': [1], 'café': [2]}),
+            'about.html': ('About', {'hello': [3], 'help': [0, 1, 300]}),
+            'empty.html': ('', {}),
+        }
+        for url in self.pages:
+            open(os.path.join(self.directory, url), 'w').close()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip(self):
+        SearchIndex(self.pages).save(self.directory)
+        self.assertEqual(SearchIndex.load(self.directory).pages, self.pages)
+
+    def test_blocks(self):
+        terms = {'term{0:04d}'.format(i): [i] for i in range(search.BLOCK_SIZE * 2 + 3)}
+        SearchIndex({'a.html': ('A', terms)}).save(self.directory)
+        header = read_header(self.directory)
+        self.assertEqual(len(header['blocks']), 3)
+        self.assertEqual(SearchIndex.load(self.directory).pages['a.html'][1], terms)
+        for term in ('term0000', 'term0127', 'term0128', 'term0258'):
+            self.assertEqual(lookup(self.directory, term), {'a.html': terms[term]})
+        self.assertEqual(lookup(self.directory, 'term0259'), {})
+        self.assertEqual(lookup(self.directory, 'aaa'), {})
+
+    def test_lookup_and_search(self):
+        SearchIndex(self.pages).save(self.directory)
+        self.assertEqual(lookup(self.directory, 'Hello'), {'index.html': [0, 5], 'about.html': [3]})
+        self.assertEqual(lookup(self.directory, 'café'), {'index.html': [2]})
+        self.assertEqual(lookup(self.directory, 'hel'), {})
+        self.assertEqual(search.search(self.directory, 'hello'), ['index.html', 'about.html'])
+        self.assertEqual(search.search(self.directory, 'hello help'), ['about.html'])
+        self.assertEqual(search.search(self.directory, 'missing'), [])
+
+    def test_damaged_index_is_empty(self):
+        SearchIndex(self.pages).save(self.directory)
+        with open(SearchIndex.paths(self.directory)[1], 'ab') as f:
+            f.write(b'\x00')
+        self.assertEqual(SearchIndex.load(self.directory).pages, {})
+
+    def test_update_drops_removed_pages(self):
+        SearchIndex(self.pages).save(self.directory)
+        os.remove(os.path.join(self.directory, 'about.html'))
+        index = update_index(self.directory, {'index.html': ('Home', {'new': [0]})})
+        self.assertEqual(sorted(index.pages), ['empty.html', 'index.html'])
+        self.assertEqual(lookup(self.directory, 'hello'), {})
+        self.assertEqual(lookup(self.directory, 'new'), {'index.html': [0]})
+
+
+if __name__ == '__main__':
+    unittest.main()
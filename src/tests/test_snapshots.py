@@ -0,0 +1,117 @@
+"""Building into snapshots, publishing them by symlink swap and pruning old ones."""
+import io
+import os
+import sys
+import tempfile
+import unittest
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from snapshots import create_snapshot, current_snapshot, discard_snapshot, list_snapshots  # noqa: E402
+from snapshots import prune_snapshots, publish_snapshot, snapshots_dir  # noqa: E402
+from generator import build_files, check_watchable  # noqa: E402
+
+
+class SnapshotsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, text):
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(text)
+
+    def read(self, name):
+        with open(os.path.join(self.root, name)) as f:
+            return f.read()
+
+    def snapshot(self, text):
+        snapshot = create_snapshot(self.root, 'site')
+        # files are hardlinked to previous snapshot, they are replaced like outputs of build
+        path = os.path.join(self.root, snapshot, 'index.html')
+        if os.path.exists(path):
+            os.remove(path)
+        self.write(os.path.join(snapshot, 'index.html'), text)
+        publish_snapshot(self.root, 'site', snapshot)
+        return os.path.basename(snapshot)
+
+    def test_publish_existing_folder(self):
+        self.write('site/index.html', 'old')
+        snapshot = create_snapshot(self.root, 'site')
+        self.assertEqual(self.read(os.path.join(snapshot, 'index.html')), 'old')
+        self.assertTrue(os.path.samefile(os.path.join(self.root, snapshot, 'index.html'),
+                                         os.path.join(self.root, 'site', 'index.html')))
+        os.remove(os.path.join(self.root, snapshot, 'index.html'))
+        self.write(os.path.join(snapshot, 'index.html'), 'new')
+        self.assertIsNone(current_snapshot(self.root, 'site'))
+        publish_snapshot(self.root, 'site', snapshot)
+        self.assertTrue(os.path.islink(os.path.join(self.root, 'site')))
+        self.assertEqual(current_snapshot(self.root, 'site'), os.path.basename(snapshot))
+        self.assertEqual(self.read('site/index.html'), 'new')
+        previous = [x for x in list_snapshots(self.root, 'site') if x != os.path.basename(snapshot)]
+        self.assertEqual(len(previous), 1)
+        self.assertEqual(self.read(os.path.join(snapshots_dir(self.root, 'site'), previous[0], 'index.html')), 'old')
+
+    def test_prune_keeps_newest_and_current(self):
+        names = [self.snapshot(str(i)) for i in range(4)]
+        self.assertEqual(list_snapshots(self.root, 'site'), names)
+        publish_snapshot(self.root, 'site', os.path.relpath(os.path.join(snapshots_dir(self.root, 'site'), names[0]),
+                                                            self.root))
+        self.assertEqual(prune_snapshots(self.root, 'site', 2), [names[1]])
+        self.assertEqual(list_snapshots(self.root, 'site'), [names[0], names[2], names[3]])
+        self.assertEqual(self.read('site/index.html'), '0')
+
+    def test_discard(self):
+        snapshot = create_snapshot(self.root, 'site')
+        discard_snapshot(self.root, snapshot)
+        self.assertEqual(list_snapshots(self.root, 'site'), [])
+
+    def build(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            build_files(self.root, 'site', force=True, snapshots=2, disk_cache=False)
+
+    def test_build(self):
+        self.write('index.html', 'one')
+        self.build()
+        self.assertEqual(len(list_snapshots(self.root, 'site')), 1)
+        self.assertEqual(self.read('site/index.html'), 'one')
+        first = current_snapshot(self.root, 'site')
+        self.write('index.html', 'two')
+        for i in range(2):
+            self.build()
+        snapshots = list_snapshots(self.root, 'site')
+        self.assertEqual(len(snapshots), 2)
+        self.assertNotIn(first, snapshots)
+        self.assertEqual(current_snapshot(self.root, 'site'), snapshots[-1])
+        self.assertEqual(self.read('site/index.html'), 'two')
+        self.assertEqual(self.read(os.path.join(snapshots_dir(self.root, 'site'), snapshots[0], 'index.html')), 'two')
+
+    def test_failed_build_is_discarded(self):
+        self.write('index.html', 'one')
+        self.build()
+        published = list_snapshots(self.root, 'site')
+        self.write('index.html', '{% if title %}')
+        with self.assertRaises(SystemExit):
+            self.build()
+        self.assertEqual(list_snapshots(self.root, 'site'), published)
+        self.assertEqual(self.read('site/index.html'), 'one')
+
+    def test_snapshots_can_not_be_watched(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            with self.assertRaises(SystemExit):
+                check_watchable(self.root, 'site', snapshots=3)
+            check_watchable(self.root, 'site')
+            self.snapshot('x')
+            with self.assertRaises(SystemExit):
+                check_watchable(self.root, 'site')
+
+
+if __name__ == '__main__':
+    unittest.main()
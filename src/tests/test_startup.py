@@ -0,0 +1,22 @@
+"""Import time budget of CLI commands, see bench_startup.py."""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_startup import COMMANDS, DEFAULT_BUDGET, check_command  # noqa: E402
+
+
+class StartupTest(unittest.TestCase):
+
+    def test_commands_within_budget(self):
+        for command in sorted(COMMANDS):
+            with self.subTest(command=command):
+                best, problems = check_command(command)
+                self.assertEqual(problems, [], '{0}: {1:.1f}ms, budget {2:.0f}ms'.format(
+                    command, best, DEFAULT_BUDGET))
+
+
+if __name__ == '__main__':
+    unittest.main()
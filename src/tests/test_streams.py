@@ -0,0 +1,121 @@
+"""Streaming stages must give the same output however their input is split into chunks."""
+import io
+import os
+import sys
+import random
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from minify import HtmlMinifier  # noqa: E402
+from fingerprint import ReferenceRewriter  # noqa: E402
+from search import TextIndexer  # noqa: E402
+
+PAGE = '''<!DOCTYPE html>
+<html>
+<head>
+    <title>  Caf&eacute;   menu </title>
+    <link rel="stylesheet" href="/css/style.css">
+    <link rel="stylesheet" href="css/print.css">
+    <script>if (a < b && c > "</p>") {   x(); }</script>
+    <style>  p  >  b { color: red }  </style>
+</head>
+<body>
+    <!-- dropped   comment -->
+    <!--[if IE]><p>kept</p><![endif]-->
+    <h1 class="a  b" data-x='1 > 0'>Hello,     world</h1>
+    <pre>  keep
+        this  </pre>
+    <textarea>  and   this </textarea>
+    <img src="/img/logo.png" alt="/css/style.css.map">
+    <p>Words words WORDS &amp; more   words, 1 < 2 and x<y.</p>
+    <a href="/css/style.css">css/style.css</a> /css/style.cssx
+</body>
+</html>
+'''
+ASSETS = {
+    'css/style.css': 'css/style.0123456789.css',
+    'css/print.css': 'css/print.abcdef0123.css',
+    'img/logo.png': 'img/logo.fedcba9876.png',
+}
+
+
+def chunks(text, rng, size):
+    position = 0
+    while position < len(text):
+        step = rng.randint(1, size)
+        yield text[position:position + step]
+        position += step
+
+
+class ChunkingTest(unittest.TestCase):
+    """Output of whole page is compared with output of the same page in random chunks."""
+
+    def run_stage(self, factory, pieces):
+        output = io.StringIO()
+        stage = factory(output)
+        for piece in pieces:
+            stage.write(piece)
+        stage.close()
+        return output.getvalue(), stage
+
+    def check(self, factory, text=PAGE):
+        whole, stage = self.run_stage(factory, [text])
+        rng = random.Random(42)
+        for size in (1, 2, 3, 5, 8, 64):
+            for _ in range(10):
+                output, other = self.run_stage(factory, list(chunks(text, rng, size)))
+                self.assertEqual(output, whole, 'chunks up to {0} characters'.format(size))
+                yield other
+        yield stage
+
+    def test_minifier(self):
+        whole, _ = self.run_stage(HtmlMinifier, [PAGE])
+        self.assertNotIn('dropped', whole)
+        self.assertIn('<!--[if IE]><p>kept</p><![endif]-->', whole)
+        self.assertIn('Hello, world', whole)
+        self.assertIn('<pre>  keep\n        this  </pre>', whole)
+        self.assertIn('"</p>") {   x(); }', whole)
+        for stage in self.check(HtmlMinifier):
+            self.assertEqual(stage.saved, len(PAGE.encode('utf-8')) - len(whole.encode('utf-8')))
+
+    def test_minifier_unfinished_input(self):
+        for text in ('<p>a <!-- never closed', '<script> x  ', 'a   <', 'a <b'):
+            list(self.check(HtmlMinifier, text))
+
+    def test_rewriter(self):
+        whole, _ = self.run_stage(lambda x: ReferenceRewriter(x, ASSETS), [PAGE])
+        self.assertIn('href="/css/style.0123456789.css"', whole)
+        self.assertIn('href="css/print.abcdef0123.css"', whole)
+        self.assertIn('src="/img/logo.fedcba9876.png"', whole)
+        self.assertIn('alt="/css/style.css.map"', whole)
+        self.assertIn('/css/style.cssx', whole)
+        list(self.check(lambda x: ReferenceRewriter(x, ASSETS)))
+
+    def test_rewriter_in_nested_page(self):
+        page = ('<link href="../../css/style.css"><link href="../css/print.css"><img src="./logo.png">'
+                '<a href="css/style.css">/css/style.css</a>')
+        factory = lambda x: ReferenceRewriter(x, ASSETS, 'blog/2024')  # noqa: E731
+        whole, _ = self.run_stage(factory, [page])
+        self.assertEqual(whole, '<link href="../../css/style.0123456789.css"><link href="../css/print.css">'
+                                '<img src="./logo.png"><a href="css/style.css">/css/style.0123456789.css</a>')
+        list(self.check(factory, page))
+        whole, _ = self.run_stage(lambda x: ReferenceRewriter(x, ASSETS), ['<img src="./img/logo.png">'])
+        self.assertEqual(whole, '<img src="./img/logo.fedcba9876.png">')
+
+    def test_rewriter_without_assets(self):
+        self.assertEqual(self.run_stage(lambda x: ReferenceRewriter(x, {}), [PAGE])[0], PAGE)
+
+    def test_indexer(self):
+        whole, stage = self.run_stage(TextIndexer, [PAGE])
+        self.assertEqual(whole, PAGE)
+        self.assertEqual(stage.title, 'Café menu')
+        self.assertEqual(stage.terms['words'], [8, 9, 10, 12])
+        self.assertNotIn('color', stage.terms)
+        self.assertNotIn('dropped', stage.terms)
+        for other in self.check(TextIndexer):
+            self.assertEqual((other.terms, other.title), (stage.terms, stage.title))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,187 @@
+"""Lexer, includes, inheritance, compiled template cache, backends and streaming render of template engine."""
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from template_engine.base import Collector, Compiler, Template, is_balanced  # noqa: E402
+from template_engine.cache import TemplateCache, template_cache  # noqa: E402
+from template_engine.lexer import tokenize, TEXT, INCLUDE, EXTENDS, BLOCK_START, BLOCK_END  # noqa: E402
+from template_engine.lexer import VARIABLE, OPEN_TAG, CLOSE_TAG  # noqa: E402
+from template_engine.exceptions import TemplateInheritanceError, TemplateLoopInheritanceError  # noqa: E402
+
+CONTEXT = {
+    'title': 'Title',
+    'items': [1, 2, 3],
+    'user': {'name': 'Ann', 'admin': True},
+    'destionation_url': 'site'
+}
+
+
+class LexerTest(unittest.TestCase):
+
+    def test_kinds(self):
+        tokens = tokenize('a{# inc.html #}{! base.html !}{? body ?}{? endblock ?}{{ x }}{% if x %}{% end %}b')
+        self.assertEqual([x.kind for x in tokens],
+                         [TEXT, INCLUDE, EXTENDS, BLOCK_START, BLOCK_END, VARIABLE, OPEN_TAG, CLOSE_TAG, TEXT])
+        self.assertEqual([x.clean for x in tokens[1:3]], ['inc.html', 'base.html'])
+
+    def test_raw_text_is_kept(self):
+        text = 'x {{ a }} {% array items %}{{ item }}{% end %} {# a.html #} { not a tag } }}'
+        self.assertEqual(''.join(x.raw for x in tokenize(text)), text)
+
+    def test_balanced(self):
+        self.assertTrue(is_balanced(tokenize('{% if a %}{% array b %}{% end %}{% else %}{% end %}')))
+        self.assertFalse(is_balanced(tokenize('{% if a %}')))
+        self.assertFalse(is_balanced(tokenize('{% end %}{% if a %}')))
+
+
+class CollectorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        os.makedirs(os.path.join(self.root, 'templates'))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, text):
+        with open(os.path.join(self.root, name), 'w') as f:
+            f.write(text)
+
+    def assemble(self, name, backend='tree', **context):
+        context = dict(CONTEXT, **context)
+        collector = Collector(self.root, '/' + name, backend=backend)
+        stream = io.StringIO()
+        collector.assemble_page_to(stream, **context)
+        page = Collector(self.root, '/' + name, backend=backend).assemble_page(**context)
+        self.assertEqual(stream.getvalue(), page)
+        return page, collector.dependencies
+
+    def test_include(self):
+        self.write('templates/header.html', '<h1>{{ title }}</h1>')
+        self.write('page.html', 'a{# templates/header.html #}b')
+        self.assertEqual(self.assemble('page.html'), ('a<h1>Title</h1>b', ['page.html', 'templates/header.html']))
+
+    def test_page_of_single_include(self):
+        self.write('templates/header.html', 'head')
+        self.write('page.html', '{# templates/header.html #}')
+        self.assertEqual(self.assemble('page.html')[0], 'head')
+
+    def test_nested_and_empty_include(self):
+        self.write('templates/empty.html', '')
+        self.write('templates/nav.html', '[{# templates/empty.html #}nav]')
+        self.write('templates/header.html', '<{# templates/nav.html #}>')
+        self.write('page.html', '{# templates/header.html #}{# templates/empty.html #}.')
+        page, dependencies = self.assemble('page.html')
+        self.assertEqual(page, '<[nav]>.')
+        self.assertEqual(sorted(dependencies),
+                         ['page.html', 'templates/empty.html', 'templates/header.html', 'templates/nav.html'])
+
+    def test_include_cycle(self):
+        self.write('templates/a.html', '{# templates/b.html #}')
+        self.write('templates/b.html', '{# templates/a.html #}')
+        self.write('page.html', '{# templates/a.html #}')
+        with self.assertRaises(TemplateLoopInheritanceError):
+            self.assemble('page.html')
+
+    def test_same_include_twice(self):
+        self.write('templates/x.html', 'x')
+        self.write('page.html', '{# templates/x.html #}{# templates/x.html #}')
+        self.assertEqual(self.assemble('page.html')[0], 'xx')
+
+    def test_inheritance(self):
+        self.write('templates/base.html', '<H|{? body ?}B{? endblock ?}>')
+        self.write('templates/middle.html',
+                   '{! templates/base.html !}{? body ?}M{? inner ?}I{? endblock ?}{? endblock ?}')
+        self.write('page.html', '\n{! templates/middle.html !}{? inner ?}{{ title }}{? endblock ?}')
+        page, dependencies = self.assemble('page.html')
+        self.assertEqual(page, '<H|MTitle>')
+        self.assertEqual(dependencies, ['page.html', 'templates/middle.html', 'templates/base.html'])
+
+    def test_inheritance_errors(self):
+        self.write('templates/a.html', '{! templates/b.html !}')
+        self.write('templates/b.html', '{! templates/a.html !}')
+        self.write('loop.html', '{! templates/a.html !}')
+        self.write('text_before.html', 'x{! templates/a.html !}')
+        with self.assertRaises(TemplateLoopInheritanceError):
+            self.assemble('loop.html')
+        with self.assertRaises(TemplateInheritanceError):
+            self.assemble('text_before.html')
+
+    def test_shared_templates_are_compiled_once(self):
+        self.write('templates/header.html', '<h1>{{ title }}</h1>{% array items %}{{ item }}{% end %}')
+        self.write('one.html', '{# templates/header.html #}one')
+        self.write('two.html', '{# templates/header.html #}two')
+        template_cache.clear()
+        self.assertEqual(self.assemble('one.html')[0], '<h1>Title</h1>123one')
+        hits = template_cache.hits
+        self.assertEqual(self.assemble('two.html')[0], '<h1>Title</h1>123two')
+        self.assertGreater(template_cache.hits, hits)
+
+    def test_runs_carry_source(self):
+        self.write('templates/header.html', '<h1>{{ title }}</h1>')
+        self.write('templates/base.html', '<{? body ?}{? endblock ?}>')
+        self.write('page.html', '{! templates/base.html !}{? body ?}a{# templates/header.html #}b{? endblock ?}')
+        collector = Collector(self.root, '/page.html')
+        runs = collector.prepare_include_tags(collector.prepare_page())
+        self.assertEqual([(source, ''.join(x.raw for x in tokens)) for source, tokens in runs],
+                         [('templates/base.html', '<'), (None, 'a'), ('templates/header.html', '<h1>{{ title }}</h1>'),
+                          (None, 'b'), ('templates/base.html', '>')])
+
+    def test_include_inside_scope_of_page(self):
+        self.write('templates/open.html', '{% if user.admin %}')
+        self.write('templates/item.html', '[{{ item }}]')
+        self.write('page.html', '{# templates/open.html #}yes{% array items %}{# templates/item.html #}{% end %}'
+                                '{% else %}no{% end %}')
+        self.assertEqual(self.assemble('page.html')[0], 'yes[1][2][3]')
+        self.assertEqual(self.assemble('page.html', user={'admin': False})[0], 'no')
+
+    def test_backends_are_equal(self):
+        self.write('templates/row.html', '{% if item > 1 %}<b>{{ item }}</b>{% else %}{{ item }}{% end %}')
+        self.write('templates/base.html', '<title>{{ title }}</title>{? body ?}{? endblock ?}{{ user.name }}')
+        self.write('page.html', '{! templates/base.html !}{? body ?}{% array items %}'
+                                '{# templates/row.html #}{{ ..title }}{% end %}'
+                                '{% if user.admin %}admin{% end %}{? endblock ?}')
+        tree = self.assemble('page.html', backend='tree')[0]
+        self.assertEqual(tree, '<title>Title</title>1Title<b>2</b>Title<b>3</b>TitleadminAnn')
+        self.assertEqual(self.assemble('page.html', backend='codegen')[0], tree)
+
+
+class TemplateTest(unittest.TestCase):
+
+    def test_cache_is_keyed_by_content(self):
+        cache = TemplateCache()
+        first = Template('{{ a }}', cache=cache)
+        second = Template('{{ a }}', cache=cache)
+        self.assertIs(first.root, second.root)
+        self.assertEqual(cache.stats()['hits'], 1)
+
+    def test_compiler_runs_match_plain_compile(self):
+        text = 'a{% if x %}{{ x }}{% end %}b'
+        tokens = tokenize(text)
+        runs = [(list(tokens[:1]), True), (list(tokens[1:4]), True), (list(tokens[4:]), False)]
+        plain = Compiler(text).compile()
+        split = Compiler(text, tokens, runs=runs, cache=TemplateCache()).compile()
+        self.assertEqual(split.render({'x': 1}), plain.render({'x': 1}))
+        self.assertEqual(''.join(split.iter_render({'x': 0})), plain.render({'x': 0}))
+
+    def test_render_to_streams_chunks(self):
+        text = '<ul>{% array items %}<li>{% if item > 1 %}{{ item }}{% else %}-{% end %}</li>{% end %}</ul>'
+        for backend in ('tree', 'codegen'):
+            template = Template(text, cache=TemplateCache(), backend=backend)
+            chunks = []
+            stream = io.StringIO()
+            stream.write = chunks.append
+            template.render_to(stream, items=[1, 2, 3])
+            self.assertEqual(''.join(chunks), template.render(items=[1, 2, 3]))
+            self.assertEqual(''.join(chunks), '<ul><li>-</li><li>2</li><li>3</li></ul>')
+            self.assertGreater(len(chunks), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
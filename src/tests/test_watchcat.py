@@ -0,0 +1,61 @@
+"""Fallback of inotify watcher to polling."""
+import os
+import sys
+import errno
+import ctypes
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import watchcat  # noqa: E402
+
+
+class FailingLibc(object):
+    """libc whose inotify_add_watch fails with ENOSPC after `limit` watches."""
+
+    def __init__(self, libc, limit):
+        self.libc = libc
+        self.limit = limit
+
+    def inotify_init1(self, flags):
+        return self.libc.inotify_init1(flags)
+
+    def inotify_add_watch(self, fd, path, mask):
+        if self.limit <= 0:
+            ctypes.set_errno(errno.ENOSPC)
+            return -1
+        self.limit -= 1
+        return self.libc.inotify_add_watch(fd, path, mask)
+
+
+@unittest.skipIf(watchcat._load_libc() is None, 'inotify is not available')
+class InotifyFallbackTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.page = os.path.join(self.tmp.name, 'blog', 'drafts', 'a.html')
+        os.makedirs(os.path.dirname(self.page))
+        open(self.page, 'w').close()
+        self.load_libc = watchcat._load_libc
+
+    def tearDown(self):
+        watchcat._load_libc = self.load_libc
+        self.tmp.cleanup()
+
+    def test_inotify(self):
+        watcher = watchcat.create_watchcat(self.tmp.name)
+        self.assertIsInstance(watcher, watchcat.InotifyWatchcat)
+        self.assertEqual(len(watcher.watches), 3)
+        os.close(watcher.fd)
+
+    def test_failed_watch_falls_back_to_polling(self):
+        libc = self.load_libc()
+        watchcat._load_libc = lambda: FailingLibc(libc, 2)
+        watcher = watchcat.create_watchcat(self.tmp.name)
+        self.assertNotIsInstance(watcher, watchcat.InotifyWatchcat)
+        self.assertEqual(watcher.files, [self.page])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,15 +1,27 @@
 import os
+import sys
+import errno
+import select
+import struct
 import threading
 import time
+import ctypes
+import ctypes.util
+
+from discovery import walk
 
 
 class Watchcat(object):
     """Our main class which watch all changes on files."""
 
-    def __init__(self, *files):
+    def __init__(self, *files, ignore=None, interval=1):
         self.files = []
         self.mod_times = {}
         self.num_changes = 0
+        self.changes = set()
+        self.ignore = ignore
+        self.interval = interval
+        self._changes_condition = threading.Condition()
         self._watching_thread = None
         self._watching_work = False
 
@@ -28,24 +40,33 @@ class Watchcat(object):
         while self._watching_work:
             if threading.main_thread().is_alive():
                 self.watch_changes()
-                time.sleep(1)
+                time.sleep(self.interval)
             else:
                 self.stop_watching()
 
     def stop_watching(self):
         """Stop thread if conditions."""
-        if self._watching_thread and self._watching_thread.isAlive():
+        if self._watching_thread and self._watching_thread.is_alive():
             self._watching_work = False
-            self._watching_thread.join()
+            if self._watching_thread is not threading.current_thread():
+                self._watching_thread.join()
 
     def watch_changes(self):
         """Memorize date of last changes and watching on them."""
-        for file in self.files:
+        changed = []
+        for file in list(self.files):
             try:
                 last_mod_time = os.stat(file).st_mtime
             except OSError:
                 time.sleep(1)
-                last_mod_time = os.stat(file).st_mtime
+                try:
+                    last_mod_time = os.stat(file).st_mtime
+                except OSError:
+                    print("File deleted: {}".format(os.path.realpath(file)))
+                    self.files.remove(file)
+                    self.mod_times.pop(file, None)
+                    changed.append(file)
+                    continue
 
             if file not in self.mod_times.keys():
                 self.mod_times[file] = last_mod_time
@@ -54,22 +75,218 @@ class Watchcat(object):
             if last_mod_time > self.mod_times[file]:
                 print("File changed: {}".format(os.path.realpath(file)))
                 self.mod_times[file] = last_mod_time
-                self.num_changes += 1
+                changed.append(file)
+        if changed:
+            self.record_changes(changed)
+
+    def record_changes(self, paths):
+        """Count one change for a burst of changed paths and wake up waiters."""
+        with self._changes_condition:
+            self.changes.update(paths)
+            self.num_changes += 1
+            self._changes_condition.notify_all()
+
+    def wait_changes(self, timeout=None):
+        """Block until something changes, return set of changed paths and forget them."""
+        with self._changes_condition:
+            if not self.changes:
+                self._changes_condition.wait(timeout)
+            changes, self.changes = self.changes, set()
+        return changes
+
+    def is_ignored(self, path):
+        return self.ignore is not None and self.ignore(path)
 
     def add_files(self, *files):
         """Func for adding files to self.files."""
         dirs = [os.path.realpath(x) for x in files if os.path.isdir(x)]
-        files = [os.path.realpath(x) for x in files if os.path.isfile(x)]
+        files = [os.path.realpath(x) for x in files if os.path.isfile(x) and not self.is_ignored(x)]
         for i in dirs:
             files += self.get_files_in_dir(i)
         self.files = files
         self.watch_changes()
 
     def get_files_in_dir(self, dirname):
-        """Recursive func for walking in dirs and finding files."""
-        z = os.listdir(dirname)
-        files = [dirname + '/' + x for x in z if os.path.isfile(dirname + '/' + x)]
-        dirs = [dirname + '/' + x for x in z if os.path.isdir(dirname + '/' + x)]
-        for i in dirs:
-            files += self.get_files_in_dir(i)
-        return files
+        """Find files in dirs recursively with one scandir per directory."""
+        entries = walk(dirname, ignore=lambda relpath, entry: self.is_ignored(entry.path))
+        return [entry.path for relpath, entry in entries if entry.is_file()]
+
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+              IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+EVENT_HEADER = struct.Struct('iIII')
+
+
+def _load_libc():
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+class InotifyWatchcat(Watchcat):
+    """Watcher which waits for inotify events instead of polling stat of every file.
+
+    Directories are watched recursively, so created, deleted and renamed files are noticed too.
+    Events which come within `delay` seconds one after another are coalesced into one change.
+    Only works on Linux, use `create_watchcat` to fall back to polling elsewhere.
+    """
+
+    def __init__(self, *files, ignore=None, delay=0.05):
+        self.libc = _load_libc()
+        if self.libc is None:
+            raise OSError(errno.ENOSYS, 'inotify is not available')
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.delay = delay
+        self.watches = {}
+        self.watched_files = set()
+        self.recursive_dirs = set()
+        try:
+            super().__init__(*files, ignore=ignore)
+        except OSError:
+            os.close(self.fd)
+            raise
+
+    def add_files(self, *files):
+        """Watch directories recursively and single files through their directories."""
+        for path in files:
+            path = os.path.realpath(path)
+            if os.path.isdir(path):
+                self.add_dir(path)
+            elif os.path.isfile(path) and not self.is_ignored(path):
+                self.watched_files.add(path)
+                self.add_watch(os.path.dirname(path))
+        self.files = sorted(self.watched_files)
+
+    def add_dir(self, dirname):
+        if self.is_ignored(dirname) or not self.add_watch(dirname):
+            return
+        self.recursive_dirs.add(dirname)
+        try:
+            entries = list(os.scandir(dirname))
+        except OSError:
+            return
+        for entry in entries:
+            if self.is_ignored(entry.path):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                self.add_dir(entry.path)
+            elif entry.is_file():
+                self.watched_files.add(entry.path)
+
+    def add_watch(self, dirname):
+        """
+        Watch directory, return False if it is already gone.
+
+        Other failures, e.g. ENOSPC when max_user_watches is reached, raise OSError,
+        as changes in the directory would be missed.
+        """
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(dirname), WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            if error in (errno.ENOENT, errno.ENOTDIR):
+                return False
+            raise OSError(error, 'inotify_add_watch failed: {0}'.format(os.strerror(error)), dirname)
+        self.watches[wd] = dirname
+        return True
+
+    def _watch_till_stop(self):
+        """Sleep in poll() until events come, then collect the whole burst."""
+        poller = select.poll()
+        poller.register(self.fd, select.POLLIN)
+        while self._watching_work:
+            if not threading.main_thread().is_alive():
+                self.stop_watching()
+                break
+            if not poller.poll(500):
+                continue
+            changed = set()
+            while poller.poll(self.delay * 1000):
+                changed.update(self.read_events())
+            changed = [x for x in changed if not self.is_ignored(x)]
+            if changed:
+                for path in sorted(changed):
+                    print("File changed: {}".format(path))
+                self.record_changes(changed)
+        os.close(self.fd)
+
+    def read_events(self):
+        """Parse available inotify events, return changed paths."""
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        changed = []
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                changed.extend(self.watched_files)
+                continue
+            dirname = self.watches.get(wd)
+            if dirname is None:
+                continue
+            if mask & IN_IGNORED:
+                del self.watches[wd]
+                continue
+            path = os.path.join(dirname, os.fsdecode(name)) if name else dirname
+            if dirname not in self.recursive_dirs and path not in self.watched_files:
+                continue
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    before = set(self.watched_files)
+                    try:
+                        self.add_dir(path)
+                    except OSError as e:
+                        print("Warning: changes in {0} are not watched, {1}".format(e.filename, e.strerror))
+                    changed.extend(self.watched_files - before)
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    removed = [x for x in self.watched_files if x.startswith(path + os.sep)]
+                    self.watched_files.difference_update(removed)
+                    changed.extend(removed)
+                continue
+            if not name:
+                continue
+            if mask & (IN_DELETE | IN_MOVED_FROM):
+                self.watched_files.discard(path)
+            elif mask & (IN_CREATE | IN_MOVED_TO):
+                self.watched_files.add(path)
+            changed.append(path)
+        self.files = sorted(self.watched_files)
+        return changed
+
+
+def create_watchcat(*files, ignore=None):
+    """Event-driven watcher where inotify works, polling Watchcat otherwise."""
+    try:
+        return InotifyWatchcat(*files, ignore=ignore)
+    except OSError as e:
+        if e.errno != errno.ENOSYS:
+            print("Warning: inotify can not watch {0} ({1}), files are polled instead".format(e.filename, e.strerror))
+        return Watchcat(*files, ignore=ignore)